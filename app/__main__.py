@@ -8,6 +8,7 @@ from app.config import DefaultSettings
 from app.config.utils import get_settings
 from app.endpoints import list_of_routes
 from app.utils import Perplexity, get_hostname
+from app.utils.codec import FastJSONResponse
 
 
 def bind_routes(application: FastAPI, setting: DefaultSettings) -> None:
@@ -28,12 +29,17 @@ def get_app() -> FastAPI:
         docs_url="/swagger",
         openapi_url="/openapi",
         version="1.0.0",
+        default_response_class=FastJSONResponse,
     )
 
     settings = get_settings()
     bind_routes(application, settings)
     application.state.settings = settings
 
+    perplexity = Perplexity()
+    application.add_event_handler("startup", perplexity.start)
+    application.add_event_handler("shutdown", perplexity.stop)
+
     return application
 
 
@@ -47,6 +53,7 @@ if __name__ == "__main__":  # pragma: no cover
         "app.__main__:app",
         host=get_hostname(settings_for_application.APP_HOST),
         port=settings_for_application.APP_PORT,
+        workers=settings_for_application.APP_WORKERS,
         # reload=True,
         reload_dirs=["app", "tests"],
         log_level="debug",
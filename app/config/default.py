@@ -16,12 +16,52 @@ class DefaultSettings(BaseSettings):
     PATH_PREFIX: str = environ.get("PATH_PREFIX", "/api")
     APP_HOST: str = environ.get("APP_HOST", "http://127.0.0.1")
     APP_PORT: int = int(environ.get("APP_PORT", 8000))
+    APP_WORKERS: int = int(environ.get("APP_WORKERS", 1))
 
     CAPMONSTER_API_KEY: str = environ.get("CAPMONSTER_API_KEY", "")
+    CAPMONSTER_URL: str = environ.get("CAPMONSTER_URL", "https://api.capmonster.cloud/")
+    CAPMONSTER_SOLVE_TIMEOUT: int = int(environ.get("CAPMONSTER_SOLVE_TIMEOUT", 150))
+    CAPMONSTER_HEDGE_PERCENTILE: int = int(environ.get("CAPMONSTER_HEDGE_PERCENTILE", 0))
+    CAPMONSTER_BALANCE_TTL: int = int(environ.get("CAPMONSTER_BALANCE_TTL", 60 * 5))
+    EMAILNATOR_URL: str = environ.get("EMAILNATOR_URL", "https://www.emailnator.com/")
+    EMAILNATOR_MAILBOX_RESERVOIR_SIZE: int = int(environ.get("EMAILNATOR_MAILBOX_RESERVOIR_SIZE", 2))
+    EMAILNATOR_MAILBOX_TTL: int = int(environ.get("EMAILNATOR_MAILBOX_TTL", 60 * 10))
 
     PERPLEXITY_CLOUDFLARE_KEY: str = environ.get("PERPLEXITY_CLOUDFLARE_KEY", "")
     PERPLEXITY_URL: str = environ.get("PERPLEXITY_URL", "https://www.perplexity.ai/")
     PERPLEXITY_UPDATE_INTERVAL: int = int(environ.get("PERPLEXITY_UPDATE_INTERVAL", 60 * 60 * 1))
+    PERPLEXITY_REFRESH_RATIO: float = float(environ.get("PERPLEXITY_REFRESH_RATIO", 0.8))
+    PERPLEXITY_CREDENTIALS_FILE: str = environ.get("PERPLEXITY_CREDENTIALS_FILE", "data/credentials.json")
+    PERPLEXITY_ANSWER_TIMEOUT: int = int(environ.get("PERPLEXITY_ANSWER_TIMEOUT", 60 * 2))
+    PERPLEXITY_POOL_SIZE: int = int(environ.get("PERPLEXITY_POOL_SIZE", 2))
+    PERPLEXITY_POOL_CLIENT_TTL: int = int(environ.get("PERPLEXITY_POOL_CLIENT_TTL", 60 * 10))
+    PERPLEXITY_POOL_WAIT_TIMEOUT: int = int(environ.get("PERPLEXITY_POOL_WAIT_TIMEOUT", 60 * 5))
+
+    PERPLEXITY_MAX_IN_FLIGHT: int = int(environ.get("PERPLEXITY_MAX_IN_FLIGHT", 16))
+    PERPLEXITY_MAX_QUEUE: int = int(environ.get("PERPLEXITY_MAX_QUEUE", 64))
+    PERPLEXITY_BATCH_CONCURRENCY: int = int(environ.get("PERPLEXITY_BATCH_CONCURRENCY", 4))
+    PERPLEXITY_BATCH_MAX_SIZE: int = int(environ.get("PERPLEXITY_BATCH_MAX_SIZE", 32))
+    PERPLEXITY_CACHE_SIZE: int = int(environ.get("PERPLEXITY_CACHE_SIZE", 1000))
+    PERPLEXITY_CACHE_TTL_CONCISE: int = int(environ.get("PERPLEXITY_CACHE_TTL_CONCISE", 60 * 60 * 1))
+    PERPLEXITY_CACHE_TTL_COPILOT: int = int(environ.get("PERPLEXITY_CACHE_TTL_COPILOT", 60 * 60 * 1))
+    PERPLEXITY_CACHE_FILE: str = environ.get("PERPLEXITY_CACHE_FILE", "")
+    PERPLEXITY_BROKER_FILE: str = environ.get("PERPLEXITY_BROKER_FILE", "")
+    PERPLEXITY_BROKER_INVENTORY_SIZE: int = int(environ.get("PERPLEXITY_BROKER_INVENTORY_SIZE", 4))
+
+    BROWSER_MAX_SESSIONS: int = int(environ.get("BROWSER_MAX_SESSIONS", 20))
+    BROWSER_WATCHDOG_TIMEOUT: int = int(environ.get("BROWSER_WATCHDOG_TIMEOUT", 60 * 5))
+    BROWSER_REQUEST_TIMEOUT: int = int(environ.get("BROWSER_REQUEST_TIMEOUT", 30))
+    BROWSER_ELEMENT_TIMEOUT: int = int(environ.get("BROWSER_ELEMENT_TIMEOUT", 15))
+    BROWSER_PAGE_LOAD_TIMEOUT: int = int(environ.get("BROWSER_PAGE_LOAD_TIMEOUT", 15))
+    BROWSER_HEADLESS: bool = environ.get("BROWSER_HEADLESS", "false").lower() == "true"
+    BROWSER_BLOCK_RESOURCES: bool = environ.get("BROWSER_BLOCK_RESOURCES", "false").lower() == "true"
+
+    HTTP_POOL_LIMIT: int = int(environ.get("HTTP_POOL_LIMIT", 100))
+    HTTP_POOL_LIMIT_PER_HOST: int = int(environ.get("HTTP_POOL_LIMIT_PER_HOST", 20))
+    HTTP_DNS_CACHE_TTL: int = int(environ.get("HTTP_DNS_CACHE_TTL", 60 * 5))
+    HTTP_KEEPALIVE_TIMEOUT: int = int(environ.get("HTTP_KEEPALIVE_TIMEOUT", 30))
+
+    TRACING_BUFFER_SIZE: int = int(environ.get("TRACING_BUFFER_SIZE", 1000))
 
     PROXY_HOST: str = environ.get("PROXY_HOST", "")
     PROXY_LOGIN: str = environ.get("PROXY_LOGIN", "")
@@ -1,10 +1,12 @@
 from .health_check import api_router as health_check_router
+from .metrics import api_router as metrics_router
 from .perplexity import api_router as perplexity_router
 
 
 list_of_routes = [
     health_check_router,
     perplexity_router,
+    metrics_router,
 ]
 
 
@@ -1,11 +1,12 @@
 from datetime import timedelta
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Query
 from starlette import status
 
 from app.config import get_settings
-from app.schemas import PerplexityStatusResponse, PingResponse
+from app.schemas import PerplexityStatus, PerplexityStatusResponse, PingResponse, TraceKind, TraceSpanResponse
 from app.utils import Perplexity
+from app.utils.tracing import TRACE_BUFFER
 
 
 api_router = APIRouter(tags=["Status"], prefix="/status")
@@ -27,11 +28,43 @@ async def health_check():
     status_code=status.HTTP_200_OK,
 )
 async def perplexity_check():
+    perplexity_status = perplexity_client.status
+    if perplexity_status == PerplexityStatus.READY and perplexity_client.admission.saturated:
+        perplexity_status = PerplexityStatus.BUSY
     return PerplexityStatusResponse(
-        status=perplexity_client.status,
-        message=perplexity_client.status,
+        status=perplexity_status,
+        message=perplexity_status,
         copilots_left=perplexity_client.copilots_left,
+        clients_ready=perplexity_client.clients_ready,
+        coalesced_hits=perplexity_client.coalescer.hits,
+        coalesced_misses=perplexity_client.coalescer.misses,
+        cache_hit_ratio=perplexity_client.cache.hit_ratio,
+        cache_size=perplexity_client.cache.size,
+        in_flight=perplexity_client.admission.in_flight,
+        queue_depth=perplexity_client.admission.queued,
+        estimated_wait=perplexity_client.admission.estimated_wait,
         last_authenticated=perplexity_client.last_update,
         next_authentication=perplexity_client.last_update
         + timedelta(seconds=get_settings().PERPLEXITY_UPDATE_INTERVAL),
     )
+
+
+@api_router.get(
+    "/traces",
+    response_model=list[TraceSpanResponse],
+    status_code=status.HTTP_200_OK,
+)
+async def slowest_traces(
+    limit: int = Query(default=10, ge=1, le=100),
+    kind: TraceKind = Query(
+        default=TraceKind.REQUEST,
+        description="Traces of API requests, of background work (pool refills, credential renewal) or all of them.",
+    ),
+):
+    # root spans of API requests are marked with their kind, everything else is started by background tasks
+    predicates = {
+        TraceKind.REQUEST: lambda span: span.attributes.get("kind") == TraceKind.REQUEST.value,
+        TraceKind.BACKGROUND: lambda span: span.attributes.get("kind") != TraceKind.REQUEST.value,
+        TraceKind.ALL: None,
+    }
+    return [span.to_dict() for span in TRACE_BUFFER.slowest(limit, predicates[kind])]
@@ -1,30 +1,196 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+from logging import getLogger
+from typing import AsyncIterator, Callable
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from starlette import status
+from starlette.background import BackgroundTask
 
-from app.schemas import PerplexityRequest, PerplexityResponse, PerplexityStatus, PerplexityUnavailableResponse
-from app.utils import Perplexity
+from app.config import get_settings
+from app.schemas import (
+    PerplexityAnswer,
+    PerplexityAnswerField,
+    PerplexityBatchItem,
+    PerplexityBatchRequest,
+    PerplexityRequest,
+    PerplexityResponse,
+    PerplexityStatus,
+    PerplexityUnavailableResponse,
+    TraceKind,
+)
+from app.utils import AdmissionRejected, Answer, Perplexity
+from app.utils.codec import dumps
+from app.utils.tracing import TRACER
 
 
 api_router = APIRouter(tags=["Perplexity"], prefix="/perplexity")
 perplexity_client = Perplexity()
 
 
+def _overloaded(exc: AdmissionRejected) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=PerplexityUnavailableResponse(status=PerplexityStatus.BUSY, message=str(exc)).model_dump(),
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @api_router.post(
     "/ask",
     response_model=PerplexityResponse,
+    # either the whole frame or only the requested fields of the answer
+    response_model_exclude_unset=True,
     status_code=status.HTTP_200_OK,
     responses={
         status.HTTP_503_SERVICE_UNAVAILABLE: {
             "description": "Request cannot be processed at the moment, try again later",
             "model": PerplexityUnavailableResponse,
         },
+        status.HTTP_504_GATEWAY_TIMEOUT: {
+            "description": "Perplexity did not answer in time",
+        },
     },
 )
-async def ask_perplexity(request: PerplexityRequest):
-    # if perplexity_client.status != PerplexityStatus.READY:
-    #     raise HTTPException(
-    #         status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-    #         detail=PerplexityUnavailableResponse(status=perplexity_client.status, message=perplexity_client.status).model_dump_json(),
-    #     )
-    response = await perplexity_client.ask(query=request.message, mode=request.mode)
+async def ask_perplexity(
+    request: PerplexityRequest,
+    fields: list[PerplexityAnswerField] = Query(
+        default=[],
+        description="Fields of the answer to return instead of the whole frame, "
+        "e.g. `?fields=answer&fields=citations`.",
+    ),
+):
+    try:
+        response = await perplexity_client.ask(
+            query=request.message, mode=request.mode, focus=request.focus, cache=request.cache
+        )
+    except AdmissionRejected as exc:
+        raise _overloaded(exc) from exc
+    except asyncio.TimeoutError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Perplexity did not answer in time"
+        ) from exc
+    if fields:
+        answer = Answer(response).project(field.value for field in fields)
+        return PerplexityResponse(answer=PerplexityAnswer(**answer))
     return PerplexityResponse(message=response)
+
+
+def _release_once(started: float) -> Callable[[], None]:
+    # admission slot is released by whichever comes first: end of the stream or end of the response
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            perplexity_client.admission.release(started)
+
+    return release
+
+
+async def _stream_events(request: PerplexityRequest, release: Callable[[], None]) -> AsyncIterator[str]:
+    try:
+        with TRACER.span(
+            "perplexity.ask_stream", kind=TraceKind.REQUEST.value, mode=request.mode.value, focus=request.focus.value
+        ):
+            async for response in perplexity_client.ask_stream(
+                query=request.message, mode=request.mode, focus=request.focus
+            ):
+                event = "final" if response.get("step_type") == "FINAL" else "step"
+                yield f"event: {event}\ndata: {dumps(response)}\n\n"
+    except asyncio.TimeoutError:
+        yield f"event: error\ndata: {dumps({'detail': 'Perplexity did not answer in time'})}\n\n"
+    except Exception as exc:  # pylint: disable=broad-except
+        # headers are already sent, so the failure is reported as the last event instead of a status code
+        getLogger("uvicorn.debug").exception("[STREAM] Failed to answer: %s", request.message)
+        yield f"event: error\ndata: {dumps({'detail': str(exc) or exc.__class__.__name__})}\n\n"
+    finally:
+        release()
+
+
+@api_router.post(
+    "/ask/stream",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Server-sent events: a `step` event for every intermediate step "
+            "and a `final` event with the complete answer, or an `error` event with `detail` if answering fails",
+            "content": {"text/event-stream": {}},
+        },
+        status.HTTP_503_SERVICE_UNAVAILABLE: {
+            "description": "Request cannot be processed at the moment, try again later",
+            "model": PerplexityUnavailableResponse,
+        },
+    },
+)
+async def ask_perplexity_stream(request: PerplexityRequest):
+    try:
+        started = await perplexity_client.admission.acquire()
+    except AdmissionRejected as exc:
+        raise _overloaded(exc) from exc
+    release = _release_once(started)
+    # the stream may never be iterated (e.g. client disconnects before the first chunk),
+    # background task runs once the response is over either way
+    try:
+        return StreamingResponse(
+            _stream_events(request, release),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            background=BackgroundTask(release),
+        )
+    except BaseException:
+        release()
+        raise
+
+
+async def _answer_batch(requests: list[PerplexityRequest]) -> AsyncIterator[str]:
+    semaphore = asyncio.Semaphore(get_settings().PERPLEXITY_BATCH_CONCURRENCY)
+
+    async def answer(index: int, request: PerplexityRequest) -> PerplexityBatchItem:
+        async with semaphore:
+            try:
+                response = await perplexity_client.ask(
+                    query=request.message, mode=request.mode, focus=request.focus, cache=request.cache
+                )
+            except Exception as exc:  # pylint: disable=broad-except
+                return PerplexityBatchItem(index=index, error=str(exc) or exc.__class__.__name__)
+        return PerplexityBatchItem(index=index, message=response)
+
+    tasks = [asyncio.create_task(answer(index, request)) for index, request in enumerate(requests)]
+    try:
+        for next_answer in asyncio.as_completed(tasks):
+            yield (await next_answer).model_dump_json() + "\n"
+    finally:
+        # client has gone away, there is no one to answer to
+        for task in tasks:
+            task.cancel()
+        # cancelled questions release their admission slots and clients before the response is over
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@api_router.post(
+    "/ask/batch",
+    status_code=status.HTTP_200_OK,
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "Newline-delimited JSON: one `PerplexityBatchItem` per question in completion order. "
+            "Every question goes through the same admission queue as `/ask`, so under load some of them "
+            "may be rejected one by one, with the overload reason in `error`",
+            "content": {"application/x-ndjson": {}},
+        },
+        status.HTTP_422_UNPROCESSABLE_ENTITY: {
+            "description": "Invalid request, e.g. more questions than `PERPLEXITY_BATCH_MAX_SIZE`",
+        },
+    },
+)
+async def ask_perplexity_batch(request: PerplexityBatchRequest):
+    max_size = get_settings().PERPLEXITY_BATCH_MAX_SIZE
+    if len(request.requests) > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Batch may contain at most {max_size} questions, got {len(request.requests)}",
+        )
+    return StreamingResponse(_answer_batch(request.requests), media_type="application/x-ndjson")
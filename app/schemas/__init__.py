@@ -1,14 +1,38 @@
-from .custom import PerplexityMode, PerplexityStatus
-from .health_check import PerplexityStatusResponse, PingResponse
-from .perplexity import PerplexityRequest, PerplexityResponse, PerplexityUnavailableResponse
+from .custom import (
+    PerplexityAnswerField,
+    PerplexityCachePolicy,
+    PerplexityFocus,
+    PerplexityMode,
+    PerplexityStatus,
+    TraceKind,
+)
+from .health_check import PerplexityStatusResponse, PingResponse, TraceSpanResponse
+from .perplexity import (
+    PerplexityAnswer,
+    PerplexityBatchItem,
+    PerplexityBatchRequest,
+    PerplexityRequest,
+    PerplexityResponse,
+    PerplexityUnavailableResponse,
+    PerplexityWebResult,
+)
 
 
 __all__ = [
     "PingResponse",
     "PerplexityStatusResponse",
+    "TraceSpanResponse",
     "PerplexityRequest",
     "PerplexityResponse",
+    "PerplexityAnswer",
+    "PerplexityWebResult",
+    "PerplexityBatchRequest",
+    "PerplexityBatchItem",
     "PerplexityUnavailableResponse",
     "PerplexityStatus",
     "PerplexityMode",
+    "PerplexityFocus",
+    "PerplexityCachePolicy",
+    "PerplexityAnswerField",
+    "TraceKind",
 ]
@@ -11,3 +11,32 @@ class PerplexityStatus(str, Enum):
 class PerplexityMode(str, Enum):
     COPILOT = "copilot"
     CONCISE = "concise"
+
+
+class PerplexityFocus(str, Enum):
+    INTERNET = "internet"
+    SCHOLAR = "scholar"
+    WRITING = "writing"
+    WOLFRAM = "wolfram"
+    YOUTUBE = "youtube"
+    REDDIT = "reddit"
+
+
+class PerplexityCachePolicy(str, Enum):
+    USE = "use"
+    REFRESH = "refresh"
+    BYPASS = "bypass"
+
+
+class PerplexityAnswerField(str, Enum):
+    ANSWER = "answer"
+    CITATIONS = "citations"
+    WEB_RESULTS = "web_results"
+    RELATED_QUERIES = "related_queries"
+    BACKEND_UUID = "backend_uuid"
+
+
+class TraceKind(str, Enum):
+    REQUEST = "request"
+    BACKGROUND = "background"
+    ALL = "all"
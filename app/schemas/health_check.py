@@ -19,9 +19,26 @@ class PerplexityStatusResponse(BaseModel):
         default=PerplexityStatus.READY, description="Human-readable Perplexity status response."
     )
     copilots_left: int = Field(default=0, description="Number of copilots left in current session.")
+    clients_ready: int = Field(default=0, description="Number of authenticated clients waiting in the pool.")
+    coalesced_hits: int = Field(default=0, description="Number of requests which joined an identical in-flight one.")
+    coalesced_misses: int = Field(default=0, description="Number of requests which were sent upstream.")
+    cache_hit_ratio: float = Field(default=0.0, description="Share of cache lookups answered from the cache.")
+    cache_size: int = Field(default=0, description="Number of answers in the in-memory cache.")
+    in_flight: int = Field(default=0, description="Number of requests being processed right now.")
+    queue_depth: int = Field(default=0, description="Number of requests waiting for their turn.")
+    estimated_wait: float = Field(default=0.0, description="Estimated wait time for a new request, in seconds.")
     last_authenticated: datetime = Field(default=datetime.now(), description="Last credentials update.")
     next_authentication: datetime = Field(default=datetime.now(), description="Next credentials update.")
 
     @field_serializer("status")
     def serialize_status(self, v):
         return v.name
+
+
+class TraceSpanResponse(BaseModel):
+    name: str = Field(description="Name of the pipeline stage.")
+    trace_id: str = Field(description="Identifier shared by all spans of one trace.")
+    start: datetime = Field(description="Time when the stage started.")
+    duration: float = Field(description="Duration of the stage, in seconds.")
+    attributes: dict = Field(default={}, description="Stage details, e.g. number of polls or retries.")
+    children: list["TraceSpanResponse"] = Field(default=[], description="Nested stages.")
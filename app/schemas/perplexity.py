@@ -1,15 +1,50 @@
 from pydantic import BaseModel, Field, field_serializer
 
-from .custom import PerplexityMode, PerplexityStatus
+from .custom import PerplexityCachePolicy, PerplexityFocus, PerplexityMode, PerplexityStatus
 
 
 class PerplexityRequest(BaseModel):
     mode: PerplexityMode = Field(default=PerplexityMode.COPILOT, description="Perplexity mode to use.")
+    focus: PerplexityFocus = Field(default=PerplexityFocus.INTERNET, description="Perplexity search focus.")
     message: str = Field(default="What is the meaning of life?", description="Question to perplexity.")
+    cache: PerplexityCachePolicy = Field(
+        default=PerplexityCachePolicy.USE,
+        description="Use cached answer, refresh it with a new one or bypass the cache completely.",
+    )
+
+
+class PerplexityWebResult(BaseModel):
+    name: str = Field(default="", description="Title of the source.")
+    url: str = Field(default="", description="URL of the source.")
+    snippet: str = Field(default="", description="Relevant part of the source.")
+
+
+class PerplexityAnswer(BaseModel):
+    answer: str = Field(default="", description="Text of the answer.")
+    citations: list[str] = Field(default=[], description="URLs of sources referenced in the answer.")
+    web_results: list[PerplexityWebResult] = Field(default=[], description="Sources found for the question.")
+    related_queries: list[str] = Field(default=[], description="Related questions suggested by perplexity.")
+    backend_uuid: str = Field(default="", description="Answer id, used for follow-up questions.")
 
 
 class PerplexityResponse(BaseModel):
-    message: dict = Field(default={"response": "This is the answer"}, description="Response from perplexity.")
+    message: dict = Field(
+        default={"response": "This is the answer"},
+        description="Response from perplexity, the whole final frame. Omitted if `fields` are requested.",
+    )
+    answer: PerplexityAnswer | None = Field(
+        default=None, description="Requested fields of the answer, present only if `fields` are requested."
+    )
+
+
+class PerplexityBatchRequest(BaseModel):
+    requests: list[PerplexityRequest] = Field(default=[PerplexityRequest()], description="Questions to perplexity.")
+
+
+class PerplexityBatchItem(BaseModel):
+    index: int = Field(default=0, description="Index of the question in the batch request.")
+    message: dict | None = Field(default=None, description="Response from perplexity.")
+    error: str | None = Field(default=None, description="Reason why the question was not answered.")
 
 
 class PerplexityUnavailableResponse(BaseModel):
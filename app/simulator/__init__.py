@@ -0,0 +1,9 @@
+from .config import SimulatorConfig
+from .server import create_app, service_urls
+
+
+__all__ = [
+    "SimulatorConfig",
+    "create_app",
+    "service_urls",
+]
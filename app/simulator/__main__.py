@@ -0,0 +1,68 @@
+"""
+Runs local simulator of Perplexity, Emailnator and Capmonster, so the application can be load-tested without network:
+
+    python -m app.simulator --port 8765 --credentials-file data/credentials.json
+
+and then start the application with settings printed on startup.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+
+from aiohttp import web
+
+from .config import SimulatorConfig
+from .server import create_app, service_urls
+from app.utils.credentials import AuthData, Credentials, CredentialStore
+
+
+SIMULATOR_USER_AGENT = (
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0 Safari/537.36"
+)
+
+
+def parse_args():
+    defaults = SimulatorConfig()
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--answer-latency", type=float, default=defaults.answer_latency)
+    parser.add_argument("--answer-jitter", type=float, default=defaults.answer_jitter)
+    parser.add_argument("--concise-steps", default=",".join(defaults.concise_steps))
+    parser.add_argument("--copilot-steps", default=",".join(defaults.copilot_steps))
+    parser.add_argument("--handshake-latency", type=float, default=defaults.handshake_latency)
+    parser.add_argument("--email-delay", type=float, default=defaults.email_delay)
+    parser.add_argument("--captcha-solve-time", type=float, default=defaults.captcha_solve_time)
+    parser.add_argument(
+        "--credentials-file",
+        default="",
+        help="write fresh credentials to this file, so the application starts without solving the captcha",
+    )
+    return parser.parse_args()
+
+
+def seed_credentials(path: str) -> None:
+    auth = AuthData(headers={"user-agent": SIMULATOR_USER_AGENT}, cookies={})
+    CredentialStore(path).save(Credentials(auth, auth, acquired_at=datetime.now(), copilots_left=5))
+
+
+def main():
+    args = parse_args()
+    config = SimulatorConfig(
+        answer_latency=args.answer_latency,
+        answer_jitter=args.answer_jitter,
+        concise_steps=tuple(filter(None, args.concise_steps.split(","))),
+        copilot_steps=tuple(filter(None, args.copilot_steps.split(","))),
+        handshake_latency=args.handshake_latency,
+        email_delay=args.email_delay,
+        captcha_solve_time=args.captcha_solve_time,
+    )
+    if args.credentials_file:
+        seed_credentials(args.credentials_file)
+    for name, value in service_urls(args.host, args.port).items():
+        print(f"{name}={value}")
+    web.run_app(create_app(config), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()
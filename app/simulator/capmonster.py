@@ -0,0 +1,48 @@
+from itertools import count
+from time import monotonic
+from uuid import uuid4
+
+from aiohttp import web
+
+from .config import SimulatorConfig
+
+
+class CapmonsterSimulator:
+    """
+    Fake Capmonster API: `createTask`, `getTaskResult` and `getBalance`.
+
+    Every task is solved after configured solve time.
+    """
+
+    def __init__(self, config: SimulatorConfig):
+        self._config = config
+        self._ids = count(1)
+        # task id -> creation time
+        self._tasks: dict[int, float] = {}
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.post("/createTask", self.create_task),
+            web.post("/getTaskResult", self.get_task_result),
+            web.post("/getBalance", self.get_balance),
+        ]
+
+    async def create_task(self, _request: web.Request) -> web.Response:
+        task_id = next(self._ids)
+        self._tasks[task_id] = monotonic()
+        return web.json_response({"errorId": 0, "taskId": task_id})
+
+    async def get_task_result(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        created_at = self._tasks.get(data.get("taskId"))
+        if created_at is None:
+            return web.json_response(
+                {"errorId": 1, "errorCode": "ERROR_NO_SUCH_CAPCHA_ID", "errorDescription": "Task not found"}
+            )
+        if monotonic() - created_at < self._config.captcha_solve_time:
+            return web.json_response({"errorId": 0, "status": "processing"})
+        del self._tasks[data["taskId"]]
+        return web.json_response({"errorId": 0, "status": "ready", "solution": {"cf_clearance": uuid4().hex}})
+
+    async def get_balance(self, _request: web.Request) -> web.Response:
+        return web.json_response({"errorId": 0, "balance": 100.0})
@@ -0,0 +1,27 @@
+class SimulatorConfig:
+    """
+    Behaviour of the simulated services.
+
+    Latencies are in seconds. Step sequences list `step_type` of intermediate frames sent before the final one,
+    `PROMPT_INPUT` step waits for the client to answer with `perplexity_step`.
+    """
+
+    def __init__(
+        self,
+        answer_latency: float = 1.0,
+        answer_jitter: float = 0.0,
+        concise_steps: tuple[str, ...] = ("INITIAL_QUERY", "SEARCH_WEB", "SEARCH_RESULTS"),
+        copilot_steps: tuple[str, ...] = ("INITIAL_QUERY", "PROMPT_INPUT", "SEARCH_WEB", "SEARCH_RESULTS"),
+        handshake_latency: float = 0.0,
+        email_delay: float = 0.5,
+        captcha_solve_time: float = 5.0,
+        ping_interval: float = 25.0,
+    ):
+        self.answer_latency = answer_latency
+        self.answer_jitter = answer_jitter
+        self.concise_steps = concise_steps
+        self.copilot_steps = copilot_steps
+        self.handshake_latency = handshake_latency
+        self.email_delay = email_delay
+        self.captcha_solve_time = captcha_solve_time
+        self.ping_interval = ping_interval
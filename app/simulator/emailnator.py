@@ -0,0 +1,54 @@
+import asyncio
+from itertools import count
+
+from aiohttp import web
+
+from .config import SimulatorConfig
+
+
+# advertisement which every new mailbox already contains, the client must skip it
+AD_MESSAGE = {"messageID": "ADSVPN", "from": "AI TOOLS", "subject": "Try our VPN", "time": "Just Now"}
+
+
+class EmailnatorSimulator:
+    """
+    Fake Emailnator API: `generate-email` and `message-list`.
+    """
+
+    def __init__(self, config: SimulatorConfig):
+        self._config = config
+        self._ids = count(1)
+        # email -> message id -> (message metadata, html body)
+        self._mailboxes: dict[str, dict[str, tuple[dict, str]]] = {}
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.post("/generate-email", self.generate_email),
+            web.post("/message-list", self.message_list),
+        ]
+
+    def deliver(self, email: str, sender: str, subject: str, body: str) -> None:
+        """
+        Puts message into the mailbox after configured delivery delay.
+        """
+
+        def put() -> None:
+            message_id = f"msg{next(self._ids)}"
+            message = {"messageID": message_id, "from": sender, "subject": subject, "time": "Just Now"}
+            self._mailboxes.setdefault(email, {})[message_id] = (message, body)
+
+        asyncio.get_running_loop().call_later(self._config.email_delay, put)
+
+    async def generate_email(self, _request: web.Request) -> web.Response:
+        email = f"simulated.user{next(self._ids)}@gmail.com"
+        self._mailboxes[email] = {}
+        return web.json_response({"email": [email]})
+
+    async def message_list(self, request: web.Request) -> web.Response:
+        data = await request.json()
+        mailbox = self._mailboxes.get(data.get("email"), {})
+        if "messageID" in data:
+            if data["messageID"] not in mailbox:
+                raise web.HTTPNotFound()
+            return web.Response(text=mailbox[data["messageID"]][1], content_type="text/html")
+        return web.json_response({"messageData": [AD_MESSAGE] + [message for message, _ in mailbox.values()]})
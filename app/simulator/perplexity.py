@@ -0,0 +1,214 @@
+import asyncio
+import json
+import random
+from logging import getLogger
+from uuid import uuid4
+
+from aiohttp import WSMsgType, web
+from yarl import URL
+
+from .config import SimulatorConfig
+from .emailnator import EmailnatorSimulator
+
+
+class PerplexitySimulator:
+    """
+    Fake Perplexity: sign in by email and socket.io server speaking
+    `perplexity_ask`, `perplexity_step` and `get_upload_url` protocol.
+    """
+
+    def __init__(self, config: SimulatorConfig, emailnator: EmailnatorSimulator):
+        self._logger = getLogger("uvicorn.debug")
+        self._config = config
+        self._emailnator = emailnator
+        self._sessions: set[str] = set()
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.get("/", self.index),
+            web.get("/search/{uuid}", self.search_page),
+            web.post("/api/auth/signin/email", self.signin_email),
+            web.get("/api/auth/callback/email", self.callback_email),
+            web.get("/socket.io/", self.socket_io),
+            web.post("/socket.io/", self.socket_io_polling_post),
+            web.post("/upload/", self.upload),
+        ]
+
+    async def index(self, _request: web.Request) -> web.Response:
+        return web.Response(text="<html><body>Perplexity simulator</body></html>", content_type="text/html")
+
+    async def search_page(self, _request: web.Request) -> web.Response:
+        response = web.Response(text="<html><body>Search</body></html>", content_type="text/html")
+        # real cookie is "<token>|<hash>" url-encoded, client takes the part before "%"
+        response.set_cookie("next-auth.csrf-token", f"{uuid4().hex}%7C{uuid4().hex}", path="/")
+        return response
+
+    async def signin_email(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        csrf_token = request.cookies.get("next-auth.csrf-token", "").split("%")[0]
+        if not csrf_token or data.get("csrfToken") != csrf_token:
+            raise web.HTTPForbidden(text="Invalid CSRF token")
+        link = request.url.join(URL("../callback/email")).with_query(token=uuid4().hex, email=data["email"])
+        self._emailnator.deliver(
+            email=data["email"],
+            sender="Perplexity <team@mail.perplexity.ai>",
+            subject="Sign in to Perplexity",
+            body=(
+                f'<html><body><a href="{request.url.origin()}">Perplexity</a>'
+                f'<a href="{link}">Sign in</a></body></html>'
+            ),
+        )
+        return web.json_response({"url": str(link)})
+
+    async def callback_email(self, _request: web.Request) -> web.Response:
+        response = web.Response(text="<html><body>Signed in</body></html>", content_type="text/html")
+        response.set_cookie("__Secure-next-auth.session-token", uuid4().hex, path="/")
+        return response
+
+    async def upload(self, request: web.Request) -> web.Response:
+        await request.read()
+        return web.Response(status=204)
+
+    async def socket_io(self, request: web.Request) -> web.StreamResponse:
+        if request.query.get("transport") == "websocket":
+            return await self._websocket(request)
+        # engine.io polling handshake: open packet with new session id
+        await asyncio.sleep(self._config.handshake_latency)
+        sid = uuid4().hex
+        self._sessions.add(sid)
+        handshake = {"sid": sid, "upgrades": ["websocket"], "pingInterval": 25000, "pingTimeout": 20000}
+        return web.Response(text="0" + json.dumps(handshake))
+
+    async def socket_io_polling_post(self, request: web.Request) -> web.Response:
+        await asyncio.sleep(self._config.handshake_latency)
+        if request.query.get("sid") not in self._sessions:
+            raise web.HTTPBadRequest(text="Unknown session")
+        await request.read()
+        return web.Response(text="OK")
+
+    async def _websocket(self, request: web.Request) -> web.WebSocketResponse:
+        if request.query.get("sid") not in self._sessions:
+            raise web.HTTPBadRequest(text="Unknown session")
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        upload_url = str(request.url.with_query(None).join(URL("../upload/")))
+        # replies to PROMPT_INPUT steps, keyed by ack id of the question
+        steps: dict[int, asyncio.Queue] = {}
+        tasks: set[asyncio.Task] = set()
+
+        def spawn(coro) -> None:
+            task = asyncio.create_task(coro)
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        spawn(self._ping(ws))
+        try:
+            async for message in ws:
+                if message.type != WSMsgType.TEXT:
+                    continue
+                if message.data == "2probe":
+                    await ws.send_str("3probe")
+                elif message.data.startswith("42"):
+                    ack_id, _, payload = message.data[2:].partition("[")
+                    event, *args = json.loads("[" + payload)
+                    if event == "perplexity_ask":
+                        steps[int(ack_id)] = asyncio.Queue()
+                        spawn(self._answer(ws, int(ack_id), args[0], args[1], steps))
+                    elif event == "perplexity_step" and int(ack_id) in steps:
+                        steps[int(ack_id)].put_nowait(args[1])
+                    elif event == "get_upload_url":
+                        await self._reply(ws, int(ack_id), self._upload_info(upload_url))
+                    else:
+                        self._logger.warning("[SIMULATOR] Unexpected event %s", event)
+                # "5" (upgrade) and "3" (pong) need no answer
+        finally:
+            for task in tasks:
+                task.cancel()
+        return ws
+
+    async def _ping(self, ws: web.WebSocketResponse) -> None:
+        while not ws.closed:
+            await asyncio.sleep(self._config.ping_interval)
+            await ws.send_str("2")
+
+    @staticmethod
+    async def _reply(ws: web.WebSocketResponse, ack_id: int, payload: dict) -> None:
+        await ws.send_str(f"43{ack_id}" + json.dumps([payload]))
+
+    @staticmethod
+    def _upload_info(upload_url: str) -> dict:
+        return {
+            "success": True,
+            "url": upload_url,
+            "fields": {"key": f"attachments/{uuid4().hex}/${{filename}}", "acl": "public-read"},
+        }
+
+    async def _answer(
+        self, ws: web.WebSocketResponse, ack_id: int, query: str, params: dict, steps: dict[int, asyncio.Queue]
+    ) -> None:
+        mode = params.get("mode", "concise")
+        step_types = self._config.copilot_steps if mode == "copilot" else self._config.concise_steps
+        latency = self._config.answer_latency + random.uniform(0, self._config.answer_jitter)
+        delay = latency / (len(step_types) + 1)
+        backend_uuid = str(uuid4())
+        frame = {
+            "status": "pending",
+            "uuid": backend_uuid,
+            "backend_uuid": backend_uuid,
+            "mode": mode,
+            "search_focus": params.get("search_focus", "internet"),
+            "query_str": query,
+            "attachments": params.get("attachments") or [],
+        }
+        history = []
+        try:
+            for step_type in step_types:
+                await asyncio.sleep(delay)
+                history.append(self._step(step_type, query))
+                await self._reply(ws, ack_id, {**frame, "step_type": step_type, "text": json.dumps(history)})
+                if step_type == "PROMPT_INPUT":
+                    await steps[ack_id].get()
+            await asyncio.sleep(delay)
+            final = {
+                **frame,
+                "status": "completed",
+                "step_type": "FINAL",
+                "text": json.dumps(self._final_text(query)),
+                "related_queries": [f"{query} explained", f"{query} examples"],
+            }
+            await self._reply(ws, ack_id, final)
+        finally:
+            steps.pop(ack_id, None)
+
+    @staticmethod
+    def _web_results(query: str) -> list[dict]:
+        return [
+            {"name": f"Result {i} for {query}", "url": f"https://example.com/{i}", "snippet": f"Snippet {i}"}
+            for i in range(1, 4)
+        ]
+
+    def _step(self, step_type: str, query: str) -> dict:
+        content = {
+            "INITIAL_QUERY": {"query": query},
+            "SEARCH_WEB": {"queries": [query]},
+            "SEARCH_RESULTS": {"web_results": self._web_results(query)},
+            "PROMPT_INPUT": {
+                "inputs": [
+                    {
+                        "type": "PROMPT_TEXT",
+                        "uuid": str(uuid4()),
+                        "content": {"description": f"What exactly do you want to know about {query}?"},
+                    }
+                ]
+            },
+        }.get(step_type, {})
+        return {"uuid": str(uuid4()), "step_type": step_type, "content": content}
+
+    def _final_text(self, query: str) -> dict:
+        web_results = self._web_results(query)
+        return {
+            "answer": f"Simulated answer to: {query}[1][2]",
+            "web_results": web_results,
+            "chunks": [f"Simulated answer to: {query}", "[1]", "[2]"],
+            "extra_web_results": [],
+        }
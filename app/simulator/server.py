@@ -0,0 +1,38 @@
+from aiohttp import web
+
+from .capmonster import CapmonsterSimulator
+from .config import SimulatorConfig
+from .emailnator import EmailnatorSimulator
+from .perplexity import PerplexitySimulator
+
+
+def _service(routes: list[web.RouteDef]) -> web.Application:
+    app = web.Application()
+    app.add_routes(routes)
+    return app
+
+
+def create_app(config: SimulatorConfig | None = None) -> web.Application:
+    """
+    Creates application serving all simulated services, each one under its own prefix:
+    `/perplexity/`, `/emailnator/` and `/capmonster/`.
+    """
+    config = config or SimulatorConfig()
+    emailnator = EmailnatorSimulator(config)
+    app = web.Application()
+    app.add_subapp("/perplexity", _service(PerplexitySimulator(config, emailnator).routes()))
+    app.add_subapp("/emailnator", _service(emailnator.routes()))
+    app.add_subapp("/capmonster", _service(CapmonsterSimulator(config).routes()))
+    return app
+
+
+def service_urls(host: str, port: int) -> dict[str, str]:
+    """
+    Settings which point the application at the simulator.
+    """
+    base = f"http://{host}:{port}"
+    return {
+        "PERPLEXITY_URL": f"{base}/perplexity/",
+        "EMAILNATOR_URL": f"{base}/emailnator/",
+        "CAPMONSTER_URL": f"{base}/capmonster/",
+    }
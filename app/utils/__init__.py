@@ -1,8 +1,13 @@
+from .admission import AdmissionRejected
+from .answer import Answer
+from .browser import Browser
 from .common import get_hostname
-from .perplexity import Browser, Perplexity
+from .perplexity import Perplexity
 
 
 __all__ = [
+    "AdmissionRejected",
+    "Answer",
     "get_hostname",
     "Browser",
     "Perplexity",
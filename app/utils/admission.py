@@ -0,0 +1,66 @@
+import asyncio
+from contextlib import asynccontextmanager
+from math import ceil
+from time import monotonic
+from typing import AsyncIterator
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"Too many requests, retry after {retry_after} seconds")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Limits number of requests processed at once and number of requests waiting for their turn.
+
+    Requests which don't fit into the wait queue are rejected immediately,
+    so overload results in fast failures instead of unbounded pile-up.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, initial_service_time: float = 10.0):
+        self._max_in_flight = max_in_flight
+        self._max_queue = max_queue
+        self._slots = asyncio.Semaphore(max_in_flight)
+        # exponentially weighted moving average of request processing time
+        self._service_time = initial_service_time
+        self.in_flight: int = 0
+        self.queued: int = 0
+
+    @property
+    def saturated(self) -> bool:
+        return self.in_flight >= self._max_in_flight
+
+    @property
+    def estimated_wait(self) -> float:
+        if not self.saturated:
+            return 0.0
+        return (self.queued + 1) * self._service_time / self._max_in_flight
+
+    async def acquire(self) -> float:
+        """
+        Waits for a free slot and returns time when processing started, which must be passed to `release`.
+        """
+        if self.saturated and self.queued >= self._max_queue:
+            raise AdmissionRejected(retry_after=max(ceil(self.estimated_wait), 1))
+        self.queued += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.in_flight += 1
+        return monotonic()
+
+    def release(self, started: float) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+        self._service_time = 0.8 * self._service_time + 0.2 * (monotonic() - started)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        started = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(started)
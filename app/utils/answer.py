@@ -0,0 +1,68 @@
+import re
+from functools import cached_property
+from typing import Any, Iterable
+
+from .codec import loads
+
+
+# answer refers to web results by their 1-based position, e.g. "...as stated[1][3]"
+CITATION = re.compile(r"\[(\d+)\]")
+
+
+class Answer:
+    """
+    Typed view of the FINAL frame, every field is parsed from the frame only when it's accessed.
+    """
+
+    FIELDS = ("answer", "citations", "web_results", "related_queries", "backend_uuid")
+
+    def __init__(self, frame: dict):
+        self._frame = frame
+
+    @cached_property
+    def _text(self) -> dict:
+        text = self._frame.get("text") or {}
+        if isinstance(text, str):
+            text = loads(text)
+        # copilot answer is the content of the last step, which is encoded once more
+        if isinstance(text, list):
+            final = next((step for step in reversed(text) if step.get("step_type") == "FINAL"), {})
+            text = final.get("content", {}).get("answer") or {}
+            if isinstance(text, str):
+                text = loads(text)
+        return text
+
+    @cached_property
+    def answer(self) -> str:
+        return self._text.get("answer", "")
+
+    @cached_property
+    def web_results(self) -> list[dict[str, str]]:
+        return [
+            {"name": result.get("name", ""), "url": result.get("url", ""), "snippet": result.get("snippet", "")}
+            for result in self._text.get("web_results", [])
+        ]
+
+    @cached_property
+    def citations(self) -> list[str]:
+        """
+        URLs of web results referenced in the answer, in order of their first reference.
+        """
+        results = self._text.get("web_results", [])
+        citations = []
+        for number in CITATION.findall(self.answer):
+            index = int(number) - 1
+            if 0 <= index < len(results) and results[index].get("url") not in citations:
+                citations.append(results[index].get("url"))
+        return citations
+
+    @cached_property
+    def related_queries(self) -> list[str]:
+        return self._frame.get("related_queries") or []
+
+    @cached_property
+    def backend_uuid(self) -> str:
+        return self._frame.get("backend_uuid", "")
+
+    def project(self, fields: Iterable[str]) -> dict[str, Any]:
+        return {field: getattr(self, field) for field in fields}
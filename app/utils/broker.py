@@ -0,0 +1,128 @@
+import json
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from time import time
+from typing import Iterator
+
+from .credentials import AuthData, Credentials
+
+
+class Broker:
+    """
+    Host-local state shared by all workers, kept in SQLite file:
+    credentials with their copilot quota, leases (so only one worker renews credentials at a time)
+    and inventory of created accounts, which any worker can connect to.
+
+    Methods are blocking, call them via `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._lock = Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT, expires_at REAL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS credentials (id INTEGER PRIMARY KEY CHECK (id = 1), "
+            "perplexity TEXT, emailnator TEXT, acquired_at TEXT, copilots_left INTEGER)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS accounts (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "created_at REAL, headers TEXT, cookies TEXT, copilot INTEGER, file_upload INTEGER)"
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # IMMEDIATE takes the write lock right away, so read-modify-write is atomic across processes
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def acquire_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Takes (or prolongs) the lease, unless another owner holds it and it's not expired yet.
+        """
+        with self._transaction() as db:
+            row = db.execute("SELECT owner, expires_at FROM leases WHERE name = ?", (name,)).fetchone()
+            if row and row[0] != owner and row[1] > time():
+                return False
+            db.execute(
+                "INSERT OR REPLACE INTO leases (name, owner, expires_at) VALUES (?, ?, ?)", (name, owner, time() + ttl)
+            )
+            return True
+
+    def release_lease(self, name: str, owner: str) -> None:
+        with self._transaction() as db:
+            db.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def load_credentials(self) -> Credentials | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT perplexity, emailnator, acquired_at, copilots_left FROM credentials WHERE id = 1"
+            ).fetchone()
+        if row is None:
+            return None
+        return Credentials(
+            perplexity=AuthData.from_dict(json.loads(row[0])),
+            emailnator=AuthData.from_dict(json.loads(row[1])),
+            acquired_at=datetime.fromisoformat(row[2]),
+            copilots_left=row[3],
+        )
+
+    def save_credentials(self, credentials: Credentials) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO credentials (id, perplexity, emailnator, acquired_at, copilots_left) "
+                "VALUES (1, ?, ?, ?, ?)",
+                (
+                    json.dumps(credentials.perplexity.to_dict()),
+                    json.dumps(credentials.emailnator.to_dict()),
+                    credentials.acquired_at.isoformat(),
+                    credentials.copilots_left,
+                ),
+            )
+
+    def use_copilot(self) -> int:
+        """
+        Decrements shared copilot quota and returns what is left.
+        """
+        with self._transaction() as db:
+            db.execute("UPDATE credentials SET copilots_left = copilots_left - 1 WHERE id = 1")
+            row = db.execute("SELECT copilots_left FROM credentials WHERE id = 1").fetchone()
+        return row[0] if row else 0
+
+    def push_account(self, headers: dict[str, str], cookies: dict[str, str], copilot: int, file_upload: int) -> None:
+        with self._transaction() as db:
+            db.execute(
+                "INSERT INTO accounts (created_at, headers, cookies, copilot, file_upload) VALUES (?, ?, ?, ?, ?)",
+                (time(), json.dumps(headers), json.dumps(cookies), copilot, file_upload),
+            )
+
+    def pop_account(self, max_age: float) -> tuple[dict[str, str], dict[str, str], int, int] | None:
+        """
+        Takes the oldest account which is not older than `max_age` seconds, stale ones are dropped.
+        """
+        with self._transaction() as db:
+            db.execute("DELETE FROM accounts WHERE created_at < ?", (time() - max_age,))
+            row = db.execute(
+                "SELECT id, headers, cookies, copilot, file_upload FROM accounts ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute("DELETE FROM accounts WHERE id = ?", (row[0],))
+        return json.loads(row[1]), json.loads(row[2]), row[3], row[4]
+
+    def accounts_ready(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+
+    def close(self) -> None:
+        self._db.close()
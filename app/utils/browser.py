@@ -0,0 +1,216 @@
+import os
+import signal
+from contextlib import ExitStack, asynccontextmanager
+from logging import getLogger
+from threading import Timer
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import urllib3
+from pyvirtualdisplay import Display
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from seleniumwire import webdriver as wire_webdriver
+
+from app.config import get_settings
+
+
+# images, fonts, media and analytics are not needed to obtain credentials
+BLOCKED_URLS = [
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.svg",
+    "*.ico",
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.mp3",
+    "*.mp4",
+    "*.webm",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*googlesyndication.com*",
+    "*doubleclick.net*",
+    "*segment.io*",
+    "*sentry.io*",
+]
+
+
+class Browser:
+    def __init__(self, chrome_options: Options, display_size: tuple[int, int] = (1000, 1000)):
+        settings = get_settings()
+        # headless Chrome renders without X server, otherwise it runs in the virtual display
+        if settings.ENV != "local" and not settings.BROWSER_HEADLESS:
+            self.display = Display(visible=False, size=display_size)
+        else:
+            self.display = None
+        self.chrome_options = chrome_options
+        if settings.BROWSER_HEADLESS and "--headless=new" not in chrome_options.arguments:
+            self.chrome_options.add_argument("--headless=new")
+            self.chrome_options.add_argument(f"--window-size={display_size[0]},{display_size[1]}")
+        self.seleniumwire_options = None
+        if settings.PROXY_HOST and settings.ENV == "local":
+            address = f"{settings.PROXY_HOST}:{settings.PROXY_PORT}"
+            if settings.PROXY_LOGIN and settings.PROXY_PASSWORD:
+                address = f"{settings.PROXY_LOGIN}:{settings.PROXY_PASSWORD}@{address}"
+            elif settings.PROXY_LOGIN:
+                address = f"{settings.PROXY_LOGIN}@{address}"
+            address = f"http://{address}"
+            # selenium-wire is only needed for proxy authentication, requests are captured via CDP (see capture.py)
+            self.seleniumwire_options = {"proxy": {"http": address}, "disable_capture": True}
+        self.driver = None
+        self.block_resources = settings.BROWSER_BLOCK_RESOURCES
+        self.page_load_timeout = settings.BROWSER_PAGE_LOAD_TIMEOUT
+
+    def __enter__(self) -> webdriver.Chrome:
+        if self.display:
+            self.display.start()
+        # network events (metadata only) are read from performance log by NetworkCapture
+        self.chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        self.chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+        # pages are driven by explicit conditions, so there is no need to wait for every subresource
+        self.chrome_options.page_load_strategy = "eager"
+        if self.seleniumwire_options:
+            self.driver = wire_webdriver.Chrome(
+                seleniumwire_options=self.seleniumwire_options, options=self.chrome_options
+            )
+        else:
+            self.driver = webdriver.Chrome(options=self.chrome_options)
+        self.driver.set_page_load_timeout(self.page_load_timeout)
+        self.configure_tab()
+        return self.driver
+
+    def configure_tab(self) -> None:
+        """
+        Blocks unneeded resources if enabled, must be done for every new tab.
+        """
+        if self.block_resources:
+            self.driver.execute_cdp_cmd("Network.enable", {})
+            self.driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.driver:
+            self.driver.quit()
+            self.driver = None
+        if self.display:
+            self.display.stop()
+
+
+# once Chrome is gone (e.g. killed by the watchdog), selenium fails with connection errors from urllib3
+BROWSER_ERRORS = (WebDriverException, urllib3.exceptions.HTTPError, OSError)
+
+
+class BrowserManager:
+    """
+    Keeps one warm Chrome instance for credential renewals instead of starting a new one every time.
+
+    Every session gets a fresh tab with cookies, storage and buffered network events cleared.
+    Browser is restarted if it doesn't respond, after `max_sessions` sessions (to keep memory flat),
+    and by the watchdog if a session takes longer than `watchdog_timeout` seconds.
+    Must be used from one thread (the renewal one), since selenium calls are blocking.
+    """
+
+    def __init__(self, chrome_options: Options, max_sessions: int, watchdog_timeout: int):
+        self._logger = getLogger("uvicorn.debug")
+        self._chrome_options = chrome_options
+        self._max_sessions = max_sessions
+        self._watchdog_timeout = watchdog_timeout
+        self._browser: Browser | None = None
+        self._browser_stack: ExitStack | None = None
+        self._browser_pid: int | None = None
+        # set by the watchdog, killed browser is replaced by the next session
+        self._killed = False
+        self._sessions = 0
+
+    def _start(self) -> webdriver.Chrome:
+        self._logger.info("[BROWSER] Starting Chrome...")
+        self._browser = Browser(self._chrome_options)
+        self._browser_stack = ExitStack()
+        try:
+            driver = self._browser_stack.enter_context(self._browser)
+        except BaseException:
+            self._stop()
+            raise
+        self._sessions = 0
+        self._killed = False
+        # pid of the browser process, so wedged browser can be killed without talking to it
+        processes = driver.execute_cdp_cmd("SystemInfo.getProcessInfo", {})["processInfo"]
+        self._browser_pid = next((process["id"] for process in processes if process["type"] == "browser"), None)
+        return driver
+
+    def _stop(self) -> None:
+        if self._browser is None:
+            return
+        try:
+            self._browser_stack.close()
+        except Exception:  # pylint: disable=broad-except
+            self._logger.warning("[BROWSER] Failed to quit Chrome gracefully.")
+        self._browser = None
+        self._browser_stack = None
+        self._browser_pid = None
+
+    def _kill(self) -> None:
+        # called by the watchdog from another thread, blocked selenium call fails once the processes are gone
+        self._logger.warning("[BROWSER] Session takes longer than %d seconds, killing Chrome.", self._watchdog_timeout)
+        browser = self._browser
+        if browser is None or browser.driver is None:
+            return
+        self._killed = True
+        for pid in (self._browser_pid, browser.driver.service.process.pid):
+            if pid:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _is_alive(self) -> bool:
+        try:
+            self._browser.driver.execute_script("return 1;")
+            return True
+        except BROWSER_ERRORS:
+            return False
+
+    def _prepare_driver(self) -> webdriver.Chrome:
+        if self._browser is not None and (self._killed or self._sessions >= self._max_sessions or not self._is_alive()):
+            self._logger.info("[BROWSER] Restarting Chrome.")
+            self._stop()
+        driver = self._browser.driver if self._browser is not None else self._start()
+        self._sessions += 1
+        # fresh tab and no state left from the previous session
+        previous_tabs = driver.window_handles
+        driver.switch_to.new_window("tab")
+        for handle in previous_tabs:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+        self._browser.configure_tab()
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        settings = get_settings()
+        for url in (settings.PERPLEXITY_URL, settings.EMAILNATOR_URL):
+            origin = f"{urlsplit(url).scheme}://{urlsplit(url).netloc}"
+            driver.execute_cdp_cmd("Storage.clearDataForOrigin", {"origin": origin, "storageTypes": "all"})
+        driver.get_log("performance")
+        return driver
+
+    @asynccontextmanager
+    async def session(self) -> AsyncIterator[webdriver.Chrome]:
+        watchdog = Timer(self._watchdog_timeout, self._kill)
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            yield self._prepare_driver()
+        except BROWSER_ERRORS:
+            # browser may be wedged or killed, next session starts a new one
+            self._stop()
+            raise
+        finally:
+            watchdog.cancel()
+
+    async def close(self) -> None:
+        self._stop()
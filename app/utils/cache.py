@@ -0,0 +1,94 @@
+import asyncio
+import json
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from time import time
+
+from .codec import dumps, loads
+
+
+CacheKey = tuple[str, str, str]
+
+
+class AnswerCache:
+    """
+    TTL cache of final answers with LRU eviction.
+
+    Optionally backed by SQLite file, which survives restarts and is shared by all workers on the host.
+    Time-to-live is configured per mode, zero TTL disables caching for the mode.
+    """
+
+    def __init__(self, max_size: int, ttl: dict[str, int], path: str = ""):
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict[CacheKey, tuple[float, dict]] = OrderedDict()
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = Lock()
+        if path:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS answers_expires_at ON answers (expires_at)")
+        self.hits: int = 0
+        self.misses: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_ratio(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _remember(self, key: CacheKey, expires_at: float, value: dict) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_size:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, key: CacheKey) -> tuple[float, dict] | None:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT expires_at, value FROM answers WHERE key = ? AND expires_at > ?", (json.dumps(key), time())
+            ).fetchone()
+        return (row[0], loads(row[1])) if row else None
+
+    def _db_set(self, key: CacheKey, expires_at: float, value: dict) -> None:
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO answers (key, expires_at, value) VALUES (?, ?, ?)",
+                (json.dumps(key), expires_at, dumps(value)),
+            )
+            self._db.execute("DELETE FROM answers WHERE expires_at <= ?", (time(),))
+
+    async def get(self, key: CacheKey) -> dict | None:
+        entry = self._entries.get(key)
+        if entry and entry[0] <= time():
+            del self._entries[key]
+            entry = None
+        if entry is None and self._db is not None:
+            entry = await asyncio.to_thread(self._db_get, key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._remember(key, *entry)
+        return entry[1]
+
+    async def set(self, key: CacheKey, value: dict, mode: str) -> None:
+        ttl = self._ttl.get(mode, 0)
+        if ttl <= 0:
+            return
+        expires_at = time() + ttl
+        self._remember(key, expires_at, value)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, expires_at, value)
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -1,13 +1,22 @@
 import asyncio
 import base64
+from collections import deque
+from logging import getLogger
+from time import monotonic
+from typing import Callable
 
 import httpx
-from selenium.common.exceptions import NoSuchElementException
+from selenium import webdriver
+from selenium.common.exceptions import NoSuchElementException, StaleElementReferenceException, TimeoutException
 from selenium.webdriver import ActionChains
 from selenium.webdriver.common.actions.wheel_input import ScrollOrigin
 from selenium.webdriver.common.by import By
-from seleniumwire import webdriver
+from selenium.webdriver.support import expected_conditions as EC
 
+from .capture import CapturedRequest, NetworkCapture
+from .metrics import CAPMONSTER_BALANCE, CAPTCHA_SOLVES
+from .sessions import shared_httpx_client
+from .tracing import TRACER
 from app.config import get_settings
 
 
@@ -15,18 +24,67 @@ class CaptchaError(Exception):
     pass
 
 
+class SolveTimeStats:
+    """
+    Recent captcha solve times, used to decide when the result is worth polling for.
+    """
+
+    def __init__(self, window: int = 50):
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, percent: float, default: float) -> float:
+        if not self._samples:
+            return default
+        ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * percent / 100), len(ordered) - 1)]
+
+
+SOLVE_TIMES = SolveTimeStats()
+# last known balance and time when it was fetched
+_balance: tuple[float, float] | None = None
+_background_tasks: set[asyncio.Task] = set()
+
+
 async def check_capmonster_balance(web_session: httpx.AsyncClient) -> float:
+    """
+    Returns account balance, fetched at most once per CAPMONSTER_BALANCE_TTL seconds.
+    """
+    global _balance  # pylint: disable=global-statement
+    settings = get_settings()
+    if _balance is not None and monotonic() - _balance[1] < settings.CAPMONSTER_BALANCE_TTL:
+        return _balance[0]
     resp = await web_session.post(
-        "https://api.capmonster.cloud/getBalance", json={"clientKey": get_settings().CAPMONSTER_API_KEY}
+        f"{settings.CAPMONSTER_URL}getBalance", json={"clientKey": settings.CAPMONSTER_API_KEY}
     )
     data = resp.json()
+    _balance = (data["balance"], monotonic())
     return data["balance"]
 
 
+def last_capmonster_balance() -> float:
+    return _balance[0] if _balance is not None else float("nan")
+
+
+CAPMONSTER_BALANCE.set_function(last_capmonster_balance)
+
+
+async def _refresh_balance() -> None:
+    try:
+        await check_capmonster_balance(shared_httpx_client())
+    except (httpx.HTTPError, KeyError, ValueError):
+        getLogger("uvicorn.debug").warning("[CAPTCHA] Failed to check Capmonster balance")
+
+
 async def request_cloudfare_challenge(web_session: httpx.AsyncClient, user_agent: str, page_source_b64: str) -> int:
     settings = get_settings()
     resp = await web_session.post(
-        "https://api.capmonster.cloud/createTask",
+        f"{settings.CAPMONSTER_URL}createTask",
         json={
             "clientKey": settings.CAPMONSTER_API_KEY,
             "task": {
@@ -48,26 +106,75 @@ async def request_cloudfare_challenge(web_session: httpx.AsyncClient, user_agent
     return data["taskId"]
 
 
+def _poll_delay(elapsed: float) -> float:
+    # nothing to poll for until the fastest solves are done, then poll often until most of them are done
+    # and back off for slow ones
+    fastest = SOLVE_TIMES.percentile(10, default=5)
+    if elapsed < fastest:
+        return fastest - elapsed
+    return min(max((elapsed - SOLVE_TIMES.percentile(90, default=30)) / 2, 1), 5)
+
+
 async def get_cloudfare_challenge_result(web_session: httpx.AsyncClient, task_id: int) -> str:
-    settings = get_settings()
-    counter = 30
-    data = None
-    while counter > 0:
-        await asyncio.sleep(5)
-        resp = await web_session.post(
-            "https://api.capmonster.cloud/getTaskResult",
-            json={
-                "clientKey": settings.CAPMONSTER_API_KEY,
-                "taskId": task_id,
-            },
-        )
-        data = resp.json()
-        if "status" in data and data["status"] == "ready":
-            return data["solution"]["cf_clearance"]
-        if "status" not in data:
-            raise CaptchaError(f"Captcha was not solved: {data}")
-        counter -= 1
-    raise CaptchaError(f"Captcha was not solved (timeout): {data}")
+    with TRACER.span("capmonster.get_task_result", task_id=task_id) as span:
+        settings = get_settings()
+        created_at = monotonic()
+        polls = 0
+        data = None
+        while monotonic() - created_at < settings.CAPMONSTER_SOLVE_TIMEOUT:
+            await asyncio.sleep(_poll_delay(monotonic() - created_at))
+            polls += 1
+            span.set_attribute("polls", polls)
+            resp = await web_session.post(
+                f"{settings.CAPMONSTER_URL}getTaskResult",
+                json={
+                    "clientKey": settings.CAPMONSTER_API_KEY,
+                    "taskId": task_id,
+                },
+            )
+            data = resp.json()
+            if "status" in data and data["status"] == "ready":
+                SOLVE_TIMES.observe(monotonic() - created_at)
+                CAPTCHA_SOLVES.inc("success")
+                return data["solution"]["cf_clearance"]
+            if "status" not in data:
+                CAPTCHA_SOLVES.inc("failure")
+                raise CaptchaError(f"Captcha was not solved: {data}")
+        CAPTCHA_SOLVES.inc("failure")
+        raise CaptchaError(f"Captcha was not solved (timeout): {data}")
+
+
+async def solve_cloudfare_challenge(web_session: httpx.AsyncClient, user_agent: str, page_source_b64: str) -> str:
+    """
+    Solves the challenge and returns cf_clearance cookie.
+
+    In hedged mode (CAPMONSTER_HEDGE_PERCENTILE > 0) a second task is submitted if the first one takes longer
+    than the given percentile of recent solve times, and whichever is solved first is used.
+    """
+
+    async def solve() -> str:
+        task_id = await request_cloudfare_challenge(web_session, user_agent, page_source_b64)
+        return await get_cloudfare_challenge_result(web_session, task_id)
+
+    hedge_percentile = get_settings().CAPMONSTER_HEDGE_PERCENTILE
+    pending = {asyncio.create_task(solve())}
+    try:
+        if hedge_percentile > 0:
+            done, _ = await asyncio.wait(pending, timeout=SOLVE_TIMES.percentile(hedge_percentile, default=30))
+            if not done:
+                TRACER.set_attribute("hedged", True)
+                pending.add(asyncio.create_task(solve()))
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
 
 
 def get_cookies_dict(driver: webdriver.Chrome) -> dict[str, str]:
@@ -77,26 +184,13 @@ def get_cookies_dict(driver: webdriver.Chrome) -> dict[str, str]:
     return cookies
 
 
-def get_perplexity_cookies(driver: webdriver.Chrome) -> dict[str, str]:
-    cookies = {}
-    for request in driver.requests:
-        if "api/auth/signin/email" in request.url:
-            for cookie in request.headers.get("cookie").split(";"):
-                name, value = cookie.split("=", 1)
-                cookies[name.strip()] = value.strip()
-            return cookies
-    raise FileNotFoundError("Perplexity cookies not found")
-
-
-def get_perplexity_headers(driver: webdriver.Chrome) -> dict[str, str]:
-    browser_headers = {}
-    for request in driver.requests:
-        browser_headers.update(request.headers)
+def get_perplexity_headers(signin_request: CapturedRequest) -> dict[str, str]:
+    browser_headers = signin_request.headers
     perplexity_headers = {
         "authority": "www.perplexity.ai",
         "accept": "*/*",
         "accept-language": "ru",
-        "baggage": browser_headers["baggage"],
+        "baggage": browser_headers.get("baggage", ""),
         "content-type": "application/x-www-form-urlencoded",
         "dnt": "1",
         "origin": "https://www.perplexity.ai",
@@ -107,20 +201,13 @@ def get_perplexity_headers(driver: webdriver.Chrome) -> dict[str, str]:
         "sec-fetch-dest": "empty",
         "sec-fetch-mode": "cors",
         "sec-fetch-site": "same-origin",
-        "sentry-trace": browser_headers["sentry-trace"],
+        "sentry-trace": browser_headers.get("sentry-trace", ""),
         "user-agent": browser_headers["user-agent"],
     }
     return perplexity_headers
 
 
-def get_emailnator_auth_data(driver: webdriver.Chrome) -> tuple[dict[str, str], dict[str, str]]:
-    message_request = None
-    for request in driver.requests:
-        if "message-list" in request.url:
-            message_request = request
-            break
-    if not message_request:
-        raise CaptchaError("'https://www.emailnator.com/message-list' request not found")
+def get_emailnator_auth_data(message_request: CapturedRequest) -> tuple[dict[str, str], dict[str, str]]:
     emailnator_headers = {
         "authority": "www.emailnator.com",
         "accept": "application/json, text/plain, */*",
@@ -139,43 +226,78 @@ def get_emailnator_auth_data(driver: webdriver.Chrome) -> tuple[dict[str, str],
         "x-requested-with": "XMLHttpRequest",
         "x-xsrf-token": message_request.headers.get("x-xsrf-token"),
     }
-    emailnator_cookies = {}
-    for cookie in message_request.headers.get("cookie").split(";"):
-        name, value = cookie.split("=", 1)
-        emailnator_cookies[name.strip()] = value.strip()
-    return emailnator_headers, emailnator_cookies
+    return emailnator_headers, message_request.cookies
+
+
+def _open(browser: webdriver.Chrome, url: str) -> None:
+    # the page is usable long before everything is loaded, so slow loading is aborted at the deadline
+    try:
+        browser.get(url)
+    except TimeoutException:
+        browser.execute_script("window.stop();")
+
+
+async def _wait_until(browser: webdriver.Chrome, condition: Callable, description: str, poll_interval: float = 0.1):
+    """
+    Async counterpart of `WebDriverWait.until`, so other tasks of the renewal loop (e.g. network capture) keep running.
+    """
+    deadline = monotonic() + get_settings().BROWSER_ELEMENT_TIMEOUT
+    while True:
+        try:
+            result = condition(browser)
+        except (NoSuchElementException, StaleElementReferenceException):
+            result = False
+        if result:
+            return result
+        if monotonic() > deadline:
+            raise CaptchaError(f"{description} not found")
+        await asyncio.sleep(poll_interval)
+
+
+async def _wait_for_request(request: "asyncio.Future[CapturedRequest]", description: str) -> CapturedRequest:
+    try:
+        return await asyncio.wait_for(request, timeout=get_settings().BROWSER_REQUEST_TIMEOUT)
+    except asyncio.TimeoutError as exc:
+        raise CaptchaError(f"{description} request not found") from exc
 
 
 async def auth_perplexity(browser: webdriver.Chrome) -> tuple[dict[str, str], dict[str, str]]:
-    browser.get("https://www.perplexity.ai")
-    page_source_b64 = base64.b64encode(browser.page_source.encode("utf-8")).decode("utf-8")
-    user_agent = browser.execute_script("return navigator.userAgent;")
-    async with httpx.AsyncClient() as web_session:
-        task_id = await request_cloudfare_challenge(web_session, user_agent, page_source_b64)
-        cf_clearance = await get_cloudfare_challenge_result(web_session, task_id)
-    browser.add_cookie({"name": "cf_clearance", "value": cf_clearance})
-    browser.get("https://www.perplexity.ai")
-    await asyncio.sleep(1)
-    browser.find_element(By.XPATH, "//div[contains(text(), 'Sign Up')]").click()
-    await asyncio.sleep(1)
-    browser.find_element(By.XPATH, "//input[@type='email']").send_keys("aa@aa.aa")
-    await asyncio.sleep(1)
-    browser.find_element(By.XPATH, "//div[contains(text(), 'Continue with Email')]").click()
-    await asyncio.sleep(3)
-    cookies = get_perplexity_cookies(browser)
-    headers = get_perplexity_headers(browser)
-    return headers, cookies
+    perplexity_url = get_settings().PERPLEXITY_URL
+    with TRACER.span("captcha.auth_perplexity"):
+        _open(browser, perplexity_url)
+        page_source_b64 = base64.b64encode(browser.page_source.encode("utf-8")).decode("utf-8")
+        user_agent = browser.execute_script("return navigator.userAgent;")
+        cf_clearance = await solve_cloudfare_challenge(shared_httpx_client(), user_agent, page_source_b64)
+        # balance is checked in background, so it doesn't delay renewal
+        task = asyncio.create_task(_refresh_balance())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        browser.add_cookie({"name": "cf_clearance", "value": cf_clearance})
+        async with NetworkCapture(browser) as capture:
+            signin = capture.expect("api/auth/signin/email")
+            _open(browser, perplexity_url)
+            sign_up = EC.element_to_be_clickable((By.XPATH, "//div[contains(text(), 'Sign Up')]"))
+            (await _wait_until(browser, sign_up, "'Sign Up' button")).click()
+            email_input = EC.visibility_of_element_located((By.XPATH, "//input[@type='email']"))
+            (await _wait_until(browser, email_input, "Email input")).send_keys("aa@aa.aa")
+            continue_button = EC.element_to_be_clickable((By.XPATH, "//div[contains(text(), 'Continue with Email')]"))
+            (await _wait_until(browser, continue_button, "'Continue with Email' button")).click()
+            signin_request = await _wait_for_request(signin, "'api/auth/signin/email'")
+        return get_perplexity_headers(signin_request), signin_request.cookies
 
 
 async def auth_emailnator(browser: webdriver.Chrome) -> tuple[dict[str, str], dict[str, str]]:
-    browser.get("https://www.emailnator.com/")
-    try:
-        btn = browser.find_element(By.NAME, "goBtn")
-        scroll_origin = ScrollOrigin.from_element(btn)
-        ActionChains(browser).scroll_from_origin(scroll_origin, 0, 200).perform()
-        btn.click()
-    except NoSuchElementException:
-        pass
-    await asyncio.sleep(3)
-    headers, cookies = get_emailnator_auth_data(browser)
-    return headers, cookies
+    emailnator_url = get_settings().EMAILNATOR_URL
+    with TRACER.span("captcha.auth_emailnator"):
+        async with NetworkCapture(browser) as capture:
+            message_list = capture.expect("message-list")
+            _open(browser, emailnator_url)
+            # inbox may be loaded without the button, then there is nothing to click
+            go_button = EC.element_to_be_clickable((By.NAME, "goBtn"))
+            btn = await _wait_until(browser, lambda driver: message_list.done() or go_button(driver), "'Go' button")
+            if btn is not True:
+                scroll_origin = ScrollOrigin.from_element(btn)
+                ActionChains(browser).scroll_from_origin(scroll_origin, 0, 200).perform()
+                btn.click()
+            message_request = await _wait_for_request(message_list, "'message-list'")
+        return get_emailnator_auth_data(message_request)
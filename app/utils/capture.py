@@ -0,0 +1,92 @@
+import asyncio
+import json
+from collections import OrderedDict
+
+from selenium.webdriver.remote.webdriver import WebDriver
+
+
+class CapturedRequest:
+    def __init__(self, url: str, method: str, headers: dict[str, str]):
+        self.url = url
+        self.method = method
+        # header names are lower-cased, as in HTTP/2
+        self.headers = {name.lower(): value for name, value in headers.items()}
+
+    @property
+    def cookies(self) -> dict[str, str]:
+        cookies = {}
+        for cookie in self.headers.get("cookie", "").split(";"):
+            if "=" in cookie:
+                name, value = cookie.split("=", 1)
+                cookies[name.strip()] = value.strip()
+        return cookies
+
+
+class NetworkCapture:
+    """
+    Captures metadata (URL, method and headers, no bodies) of requests matching registered URL patterns,
+    using CDP Network events from Chrome's performance log.
+
+    Patterns must be registered with `expect` before navigation, the returned future is resolved
+    as soon as the matching request is sent. Browser needs `goog:loggingPrefs` with performance logging enabled.
+    """
+
+    def __init__(self, driver: WebDriver, poll_interval: float = 0.1):
+        self._driver = driver
+        self._poll_interval = poll_interval
+        self._expected: list[tuple[str, asyncio.Future[CapturedRequest]]] = []
+        # matching requests waiting for their extra info (actual headers, including cookies), keyed by request id
+        self._requests: dict[str, tuple[asyncio.Future[CapturedRequest], str, str, dict[str, str]]] = {}
+        # extra info may arrive before the request itself, only the most recent ones are kept
+        self._extra_headers: OrderedDict[str, dict[str, str]] = OrderedDict()
+        self._poller: asyncio.Task | None = None
+
+    def expect(self, pattern: str) -> asyncio.Future[CapturedRequest]:
+        future = asyncio.get_running_loop().create_future()
+        self._expected.append((pattern, future))
+        return future
+
+    async def __aenter__(self) -> "NetworkCapture":
+        # events of previous pages are of no interest
+        self._driver.get_log("performance")
+        self._poller = asyncio.create_task(self._poll())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        self._poller.cancel()
+        await asyncio.gather(self._poller, return_exceptions=True)
+        for _, future in self._expected:
+            future.cancel()
+
+    async def _poll(self) -> None:
+        while True:
+            for entry in self._driver.get_log("performance"):
+                self._handle(json.loads(entry["message"])["message"])
+            await asyncio.sleep(self._poll_interval)
+
+    def _handle(self, event: dict) -> None:
+        params = event.get("params", {})
+        if event.get("method") == "Network.requestWillBeSent":
+            request = params["request"]
+            for pattern, future in self._expected:
+                if pattern in request["url"] and not future.done():
+                    self._expected.remove((pattern, future))
+                    self._requests[params["requestId"]] = (
+                        future,
+                        request["url"],
+                        request["method"],
+                        request["headers"],
+                    )
+                    break
+        elif event.get("method") == "Network.requestWillBeSentExtraInfo":
+            self._extra_headers[params["requestId"]] = params["headers"]
+            while len(self._extra_headers) > 256:
+                self._extra_headers.popitem(last=False)
+        else:
+            return
+        request_id = params["requestId"]
+        if request_id in self._requests and request_id in self._extra_headers:
+            future, url, method, headers = self._requests.pop(request_id)
+            headers = {**headers, **self._extra_headers.pop(request_id)}
+            if not future.done():
+                future.set_result(CapturedRequest(url, method, headers))
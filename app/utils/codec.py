@@ -0,0 +1,92 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# orjson is a dependency, stdlib fallback keeps the code working in environments without it
+JSON_BACKEND = "orjson" if orjson else "json"
+
+
+def loads(data: str | bytes) -> Any:
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any) -> str:
+    """
+    Compact JSON with non-ASCII characters kept as is, whatever backend is used.
+    """
+    if orjson:
+        return orjson.dumps(value).decode("utf-8")
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+def dumps_bytes(value: Any) -> bytes:
+    if orjson:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with the fast backend.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bytes(content)
+
+
+class Slot:
+    """
+    Placeholder for a value which is filled in on every render of `FrameTemplate`.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FrameTemplate:
+    """
+    Socket.io event serialized once, only `Slot` values are serialized on every render.
+
+        template = FrameTemplate(["perplexity_ask", Slot("query"), {"version": "2.1", "mode": Slot("mode")}])
+        template.render(query="...", mode="concise")
+    """
+
+    def __init__(self, event: Any):
+        self._names: list[str] = []
+        self._parts: list[str] = []
+        text = dumps(self._mark(event))
+        for index in range(len(self._names)):
+            part, text = text.split(dumps(self._token(index)), 1)
+            self._parts.append(part)
+        self._parts.append(text)
+
+    @staticmethod
+    def _token(index: int) -> str:
+        return f"__slot_{index}__"
+
+    def _mark(self, value: Any) -> Any:
+        if isinstance(value, Slot):
+            self._names.append(value.name)
+            return self._token(len(self._names) - 1)
+        if isinstance(value, dict):
+            return {key: self._mark(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._mark(item) for item in value]
+        return value
+
+    def render(self, **values: Any) -> str:
+        chunks = [self._parts[0]]
+        for name, part in zip(self._names, self._parts[1:]):
+            chunks.append(dumps(values[name]))
+            chunks.append(part)
+        return "".join(chunks)
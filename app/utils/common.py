@@ -1,11 +1,29 @@
+import asyncio
 from abc import abstractmethod
+from contextvars import Context, copy_context
+from threading import Thread
+from typing import Any, Coroutine, TypeVar
 from urllib.parse import urlparse
 
 
+T = TypeVar("T")
+
+
+async def _run_in_context(context: Context, coro: Coroutine[Any, Any, T]) -> T:
+    # tasks don't inherit context across loops, so context variables (e.g. current trace span) are copied over
+    for variable, value in context.items():
+        variable.set(value)
+    return await coro
+
+
 def get_hostname(url: str) -> str:
     return urlparse(url).netloc
 
 
+def normalize_query(query: str) -> str:
+    return " ".join(query.split()).casefold()
+
+
 # https://dev.to/akarshan/asynchronous-python-magic-how-to-create-awaitable-constructors-with-asyncmixin-18j5
 # https://web.archive.org/web/20230915163459/https://dev.to/akarshan/asynchronous-python-magic-how-to-create-awaitable-constructors-with-asyncmixin-18j5
 class AsyncMixin:
@@ -26,3 +44,41 @@ class AsyncMixin:
 
     def __await__(self):
         return self.__initobj().__await__()
+
+
+class LoopThread:
+    """
+    Event loop running in a dedicated daemon thread.
+
+    Coroutines which make blocking calls (e.g. Selenium) are run here,
+    so they only block this loop and not the one serving requests.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: Thread | None = None
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        if self._thread is None:
+            self._loop = asyncio.new_event_loop()
+            self._thread = Thread(target=self._loop.run_forever, name=self._name, daemon=True)
+            self._thread.start()
+        return self._loop
+
+    async def run(self, coro: Coroutine[Any, Any, T]) -> T:
+        """
+        Runs coroutine in the thread's loop and waits for the result without blocking the current loop.
+        """
+        loop = self._ensure_started()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(_run_in_context(copy_context(), coro), loop))
+
+    @property
+    def started(self) -> bool:
+        return self._thread is not None
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread = None
@@ -0,0 +1,70 @@
+import json
+import os
+from datetime import datetime, timedelta
+from logging import getLogger
+from pathlib import Path
+
+
+class AuthData:
+    def __init__(self, headers: dict[str, str], cookies: dict[str, str]):
+        self.headers = headers
+        self.cookies = cookies
+
+    def to_dict(self) -> dict:
+        return {"headers": self.headers, "cookies": self.cookies}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "AuthData":
+        return cls(headers=data["headers"], cookies=data["cookies"])
+
+
+class Credentials:
+    def __init__(self, perplexity: AuthData, emailnator: AuthData, acquired_at: datetime, copilots_left: int):
+        self.perplexity = perplexity
+        self.emailnator = emailnator
+        self.acquired_at = acquired_at
+        self.copilots_left = copilots_left
+
+    def is_fresh(self, max_age: int) -> bool:
+        return self.acquired_at + timedelta(seconds=max_age) > datetime.now()
+
+
+class CredentialStore:
+    """
+    Keeps the last acquired credentials (including cf_clearance cookie) on disk,
+    so they can be reused after restart instead of solving the captcha again.
+    """
+
+    def __init__(self, path: str):
+        self._logger = getLogger("uvicorn.debug")
+        self._path = Path(path)
+
+    def load(self) -> Credentials | None:
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            return Credentials(
+                perplexity=AuthData.from_dict(data["perplexity"]),
+                emailnator=AuthData.from_dict(data["emailnator"]),
+                acquired_at=datetime.fromisoformat(data["acquired_at"]),
+                copilots_left=data["copilots_left"],
+            )
+        except FileNotFoundError:
+            return None
+        except (ValueError, KeyError, TypeError):
+            self._logger.warning("[CREDENTIALS] Ignoring malformed credentials file %s", self._path)
+            return None
+
+    def save(self, credentials: Credentials) -> None:
+        data = {
+            "perplexity": credentials.perplexity.to_dict(),
+            "emailnator": credentials.emailnator.to_dict(),
+            "acquired_at": credentials.acquired_at.isoformat(),
+            "copilots_left": credentials.copilots_left,
+        }
+        # write to temporary file first, so readers never see a partially written file
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self._path.with_name(f"{self._path.name}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, self._path)
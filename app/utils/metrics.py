@@ -0,0 +1,140 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Iterator
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, description: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self._lock = Lock()
+        REGISTRY.append(self)
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        pass
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, description, labelnames)
+        self._values: dict[tuple[str, ...], float] = {} if labelnames else {(): 0}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in values.items():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str, function: Callable[[], float] | None = None):
+        super().__init__(name, description)
+        self._value = 0.0
+        self._function = function
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def _samples(self) -> Iterator[str]:
+        yield f"{self.name} {self._function() if self._function else self._value}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100),
+    ):
+        super().__init__(name, description, labelnames)
+        self._buckets = buckets
+        # per label set: counts per bucket (last one is +Inf), sum of observations
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self._buckets) + 1), [0.0]))
+            counts[bisect_left(self._buckets, value)] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - started, *labels)
+
+    def _samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {labels: (list(counts), total[0]) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in values.items():
+            cumulative = 0
+            for bound, count in zip((*self._buckets, "+Inf"), counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, f'le="{bound}"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render_metrics() -> str:
+    """
+    Renders all metrics in Prometheus text exposition format.
+    """
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+PHASE_DURATION = Histogram(
+    "perplexity_phase_duration_seconds",
+    "Duration of request pipeline phases: renewal, handshake, account_creation, answer.",
+    labelnames=("phase",),
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+RENEWALS = Counter("perplexity_renewals_total", "Credential renewals by result.", labelnames=("result",))
+CAPTCHA_SOLVES = Counter("perplexity_captcha_solves_total", "Captcha solves by result.", labelnames=("result",))
+REQUESTS = Counter("perplexity_requests_total", "Searches sent upstream by mode.", labelnames=("mode",))
+WEBSOCKET_ERRORS = Counter("perplexity_websocket_errors_total", "Websocket connection and message errors.")
+WEBSOCKET_CONNECTIONS = Gauge("perplexity_websocket_connections", "Open websocket connections.")
+REQUESTS_IN_FLIGHT = Gauge("perplexity_requests_in_flight", "Searches being processed right now.")
+CAPMONSTER_BALANCE = Gauge("perplexity_capmonster_balance", "Last known Capmonster balance.")
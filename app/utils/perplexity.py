@@ -1,79 +1,44 @@
+import asyncio
 from datetime import datetime, timedelta
 from logging import getLogger
+from typing import AsyncIterator
+from uuid import uuid4
 
-from pyvirtualdisplay import Display
 from selenium.webdriver.chrome.options import Options
-from seleniumwire import webdriver
 
+from .admission import AdmissionController
+from .broker import Broker
+from .browser import BrowserManager
+from .cache import AnswerCache
 from .captcha import auth_emailnator, auth_perplexity
+from .coalescer import Coalescer
+from .common import LoopThread, normalize_query
+from .credentials import AuthData, Credentials, CredentialStore
+from .metrics import PHASE_DURATION, RENEWALS, REQUESTS, REQUESTS_IN_FLIGHT
 from .perplexity_client import Client as PerplexityClient
+from .perplexity_client import Emailnator, cookiejar_to_dict
+from .pool import ClientPool
+from .sessions import close_shared_sessions
+from .tracing import TRACER
 from app.config import get_settings
-from app.schemas import PerplexityMode, PerplexityStatus
+from app.schemas import PerplexityCachePolicy, PerplexityFocus, PerplexityMode, PerplexityStatus, TraceKind
 
 
-class Browser:
-    def __init__(
-        self, chrome_options: Options, force_timeout: int | None = None, display_size: tuple[int, int] = (1000, 1000)
-    ):
-        settings = get_settings()
-        if settings.ENV != "local":
-            self.display = Display(visible=False, size=display_size)
-        else:
-            self.display = None
-        self.chrome_options = chrome_options
-        self.seleniumwire_options = None
-        if settings.PROXY_HOST and settings.ENV == "local":
-            address = f"{settings.PROXY_HOST}:{settings.PROXY_PORT}"
-            if settings.PROXY_LOGIN and settings.PROXY_PASSWORD:
-                address = f"{settings.PROXY_LOGIN}:{settings.PROXY_PASSWORD}@{address}"
-            elif settings.PROXY_LOGIN:
-                address = f"{settings.PROXY_LOGIN}@{address}"
-            address = f"http://{address}"
-            self.seleniumwire_options = {"proxy": {"http": address}}
-        self.driver = None
-        self.force_timeout = force_timeout
-
-    def __enter__(self) -> webdriver.Chrome:
-        if self.display:
-            self.display.start()
-        self.driver = webdriver.Chrome(seleniumwire_options=self.seleniumwire_options, options=self.chrome_options)
-        if self.force_timeout:
-            stop_script = (
-                """
-                var counter = 0;
-                var interval = setInterval(function() {
-                    counter++;
-                    if (counter === %d) {
-                        clearInterval(interval); // stop the interval
-                        window.stop(); // this will abort loading
-                    }
-                }, 1000);
-            """
-                % self.force_timeout
-            )
-            self.driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument", {"source": stop_script})
-        return self.driver
-
-    def __exit__(self, exc_type, exc_value, traceback):
-        if self.driver:
-            self.driver.quit()
-            self.driver = None
-        if self.display:
-            self.display.stop()
+# renewal takes a few minutes at most, lease of a crashed worker expires after that
+RENEWAL_LEASE_TTL = 60 * 10
+INVENTORY_LEASE_TTL = 60 * 2
 
 
 class Perplexity:
-    class AuthData:
-        def __init__(self, headers: dict[str, str], cookies: dict[str, str]):
-            self.headers = headers
-            self.cookies = cookies
-
     def __new__(cls, *args, **kwargs):
         if not hasattr(cls, "_instance"):
             cls._instance = super(Perplexity, cls).__new__(cls, *args, **kwargs)
         return cls._instance
 
     def __init__(self):
+        if hasattr(self, "_pool"):
+            return
+        settings = get_settings()
         self._logger = getLogger("uvicorn.debug")
         self.status: PerplexityStatus = PerplexityStatus.INIT
         self._chrome_options = Options()
@@ -82,48 +47,373 @@ class Perplexity:
         self._chrome_options.add_argument("--disable-dev-shm-usage")
         self._chrome_options.add_argument("--start-maximized")
         self.copilots_left: int = 0
-        self._perplexity_auth: Perplexity.AuthData | None = None
-        self._emailnator_auth: Perplexity.AuthData | None = None
+        self._perplexity_auth: AuthData | None = None
+        self._emailnator_auth: AuthData | None = None
         self.last_update: datetime = datetime.fromtimestamp(0)
+        self._credential_store: CredentialStore | None = None
+        # with the broker, workers of the host share credentials, copilot quota and created accounts
+        self._broker: Broker | None = None
+        self._worker_id = uuid4().hex
+        if settings.PERPLEXITY_BROKER_FILE:
+            self._broker = Broker(settings.PERPLEXITY_BROKER_FILE)
+        if settings.PERPLEXITY_CREDENTIALS_FILE:
+            self._credential_store = CredentialStore(settings.PERPLEXITY_CREDENTIALS_FILE)
+        # shared credentials are preferred, the file seeds the broker when it's empty
+        credentials = self._broker.load_credentials() if self._broker else None
+        if credentials is None and self._credential_store:
+            credentials = self._credential_store.load()
+            if credentials and self._broker:
+                self._broker.save_credentials(credentials)
+        self._load_credentials(credentials)
+        # browser automation is blocking, so renewal runs in its own thread
+        self._renewal_thread = LoopThread("credentials-renewal")
+        self._browsers = BrowserManager(
+            self._chrome_options,
+            max_sessions=settings.BROWSER_MAX_SESSIONS,
+            watchdog_timeout=settings.BROWSER_WATCHDOG_TIMEOUT,
+        )
+        # in-flight renewal shared by all callers which need new credentials
+        self._renewal: asyncio.Task | None = None
+        self._refresher: asyncio.Task | None = None
+        self._stocker: asyncio.Task | None = None
+        self._pool = ClientPool(
+            self._create_client,
+            size=settings.PERPLEXITY_POOL_SIZE,
+            max_age=settings.PERPLEXITY_POOL_CLIENT_TTL,
+            wait_timeout=settings.PERPLEXITY_POOL_WAIT_TIMEOUT,
+        )
+        # mailboxes generated beforehand (with their ads already recorded) speed up account creation
+        self._mailboxes = ClientPool(
+            self._create_mailbox,
+            size=settings.EMAILNATOR_MAILBOX_RESERVOIR_SIZE,
+            max_age=settings.EMAILNATOR_MAILBOX_TTL,
+            name="mailbox",
+        )
+        # concise queries don't use copilots, so they are multiplexed over one shared client
+        self._shared_client: PerplexityClient | None = None
+        self._shared_client_lock = asyncio.Lock()
+        self._shared_client_users: dict[PerplexityClient, int] = {}
+        # identical concurrent questions are sent upstream only once
+        self.coalescer = Coalescer()
+        self.admission = AdmissionController(
+            max_in_flight=settings.PERPLEXITY_MAX_IN_FLIGHT, max_queue=settings.PERPLEXITY_MAX_QUEUE
+        )
+        REQUESTS_IN_FLIGHT.set_function(lambda: self.admission.in_flight)
+        self.cache = AnswerCache(
+            max_size=settings.PERPLEXITY_CACHE_SIZE,
+            ttl={
+                PerplexityMode.CONCISE.value: settings.PERPLEXITY_CACHE_TTL_CONCISE,
+                PerplexityMode.COPILOT.value: settings.PERPLEXITY_CACHE_TTL_COPILOT,
+            },
+            path=settings.PERPLEXITY_CACHE_FILE or settings.PERPLEXITY_BROKER_FILE,
+        )
+
+    @property
+    def clients_ready(self) -> int:
+        return self._pool.ready
+
+    def start(self) -> None:
+        """
+        Starts refreshing credentials and filling the pool of ready clients in background.
+        """
+        if self._refresher is None:
+            self._refresher = asyncio.create_task(self._refresh_credentials())
+        if self._broker is not None and self._stocker is None:
+            self._stocker = asyncio.create_task(self._stock_accounts())
+        self._mailboxes.start()
+        self._pool.start()
+
+    async def stop(self) -> None:
+        await self._pool.stop()
+        await self._mailboxes.stop()
+        for task in (self._refresher, self._renewal, self._stocker):
+            if task:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        self._refresher = self._renewal = self._stocker = None
+        if self._renewal_thread.started:
+            await self._renewal_thread.run(self._browsers.close())
+            await self._renewal_thread.run(close_shared_sessions())
+        self._renewal_thread.stop()
+        if self._shared_client:
+            await self._shared_client.close()
+            self._shared_client = None
+        await close_shared_sessions()
+        self.cache.close()
+        if self._broker is not None:
+            self._broker.close()
+
+    def _load_credentials(self, credentials: Credentials | None) -> bool:
+        if credentials is None or not credentials.is_fresh(get_settings().PERPLEXITY_UPDATE_INTERVAL):
+            return False
+        self._perplexity_auth = credentials.perplexity
+        self._emailnator_auth = credentials.emailnator
+        self.last_update = credentials.acquired_at
+        self.copilots_left = credentials.copilots_left
+        self.status = PerplexityStatus.READY
+        self._logger.info("[PERPLEXITY] Reusing stored credentials from %s", self.last_update)
+        return True
+
+    async def _save_credentials(self) -> None:
+        credentials = Credentials(self._perplexity_auth, self._emailnator_auth, self.last_update, self.copilots_left)
+        if self._broker is not None:
+            await asyncio.to_thread(self._broker.save_credentials, credentials)
+        if self._credential_store is not None:
+            self._credential_store.save(credentials)
+
+    async def _load_shared_credentials(self) -> bool:
+        """
+        Takes credentials renewed by another worker, if they are newer than ours and still usable.
+        """
+        credentials = await asyncio.to_thread(self._broker.load_credentials)
+        if credentials is None or credentials.acquired_at <= self.last_update or credentials.copilots_left <= 0:
+            return False
+        return self._load_credentials(credentials)
+
+    async def _fetch_credentials(self) -> tuple[AuthData, AuthData]:
+        # runs in the renewal thread
+        async with self._browsers.session() as browser:
+            perplexity_auth = AuthData(*await auth_perplexity(browser))
+            self._logger.info("[PERPLEXITY] Perplexity headers: %s", perplexity_auth.headers)
+            self._logger.info("[PERPLEXITY] Perplexity cookies: %s", perplexity_auth.cookies)
+            emailnator_auth = AuthData(*await auth_emailnator(browser))
+            self._logger.info("[PERPLEXITY] Emailnator headers: %s", emailnator_auth.headers)
+            self._logger.info("[PERPLEXITY] Emailnator cookies: %s", emailnator_auth.cookies)
+        return perplexity_auth, emailnator_auth
 
     async def _renew_cookies(self):
-        self.status = PerplexityStatus.UPDATING
-        with Browser(self._chrome_options, force_timeout=5) as browser:
-            self._perplexity_auth = Perplexity.AuthData(*await auth_perplexity(browser))
-            self._logger.info("[PERPLEXITY] Perplexity headers: %s", self._perplexity_auth.headers)
-            self._logger.info("[PERPLEXITY] Perplexity cookies: %s", self._perplexity_auth.cookies)
-            self._emailnator_auth = Perplexity.AuthData(*await auth_emailnator(browser))
-            self._logger.info("[PERPLEXITY] Emailnator headers: %s", self._emailnator_auth.headers)
-            self._logger.info("[PERPLEXITY] Emailnator cookies: %s", self._emailnator_auth.cookies)
+        # old credentials keep serving until the new ones are ready
+        if self._credentials_expired():
+            self.status = PerplexityStatus.UPDATING
+        if self._broker is None:
+            await self._fetch_and_save_credentials()
+            return
+        # only one worker of the host renews credentials, the others wait and take them from the broker
+        while not await self._load_shared_credentials():
+            if await asyncio.to_thread(self._broker.acquire_lease, "renewal", self._worker_id, RENEWAL_LEASE_TTL):
+                try:
+                    if not await self._load_shared_credentials():
+                        await self._fetch_and_save_credentials()
+                finally:
+                    await asyncio.to_thread(self._broker.release_lease, "renewal", self._worker_id)
+                return
+            await asyncio.sleep(2)
+
+    async def _fetch_and_save_credentials(self):
+        try:
+            with TRACER.span("perplexity.renew_cookies"), PHASE_DURATION.time("renewal"):
+                credentials = await self._renewal_thread.run(self._fetch_credentials())
+        except Exception:
+            RENEWALS.inc("failure")
+            raise
+        RENEWALS.inc("success")
+        self._perplexity_auth, self._emailnator_auth = credentials
         self.last_update = datetime.now()
         self.copilots_left = 5
+        await self._save_credentials()
         self.status = PerplexityStatus.READY
 
-    async def _create_client(self) -> PerplexityClient:
-        if (
-            self.copilots_left == 0
+    def _credentials_expired(self) -> bool:
+        return (
+            self.copilots_left <= 0
             or self._perplexity_auth is None
             or self.last_update + timedelta(seconds=get_settings().PERPLEXITY_UPDATE_INTERVAL) < datetime.now()
-        ):
-            self._logger.info("[PERPLEXITY] Fetching credentials for new client...")
-            await self._renew_cookies()
-            self._logger.info("[PERPLEXITY] Credentials fetched. Authenticating...")
-        else:
-            self._logger.info("[PERPLEXITY] Using existing credentials for new client. Authenticating...")
-        client = await PerplexityClient(self._perplexity_auth.headers, self._perplexity_auth.cookies)
-        self._logger.info("[PERPLEXITY] Authenticated. Creating account...")
-        await client.create_account(self._emailnator_auth.headers, self._emailnator_auth.cookies)
-        self._logger.info("[PERPLEXITY] Account created.")
+        )
+
+    async def _renew_once(self) -> None:
+        """
+        Starts renewal or joins the one already in progress.
+        """
+        if self._renewal is None or self._renewal.done():
+            self._renewal = asyncio.create_task(self._renew_cookies())
+        # shielded, so a cancelled caller doesn't cancel renewal for everyone else
+        await asyncio.shield(self._renewal)
+
+    async def _refresh_credentials(self) -> None:
+        settings = get_settings()
+        while True:
+            refresh_at = self.last_update + timedelta(
+                seconds=settings.PERPLEXITY_UPDATE_INTERVAL * settings.PERPLEXITY_REFRESH_RATIO
+            )
+            if self.copilots_left > 0 and refresh_at > datetime.now():
+                await asyncio.sleep(min((refresh_at - datetime.now()).total_seconds(), 60))
+                continue
+            self._logger.info("[PERPLEXITY] Refreshing credentials ahead of expiration...")
+            try:
+                await self._renew_once()
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("[PERPLEXITY] Failed to refresh credentials, retrying in 30 seconds.")
+                await asyncio.sleep(30)
+
+    async def _create_client(self) -> PerplexityClient:
+        if self._broker is not None:
+            account = await asyncio.to_thread(self._broker.pop_account, get_settings().PERPLEXITY_POOL_CLIENT_TTL)
+            if account is not None:
+                return await self._connect_account(*account)
+        return await self._create_account()
+
+    async def _connect_account(
+        self, headers: dict[str, str], cookies: dict[str, str], copilot: int, file_upload: int
+    ) -> PerplexityClient:
+        with TRACER.span("perplexity.connect_account"), PHASE_DURATION.time("handshake"):
+            client = await PerplexityClient(headers, cookies, base_url=get_settings().PERPLEXITY_URL)
+        client.copilot, client.file_upload = copilot, file_upload
         return client
 
-    async def ask(self, query: str, mode: PerplexityMode) -> str:
-        self.status = PerplexityStatus.BUSY
-        client = await self._create_client()
-        response = await client.search(query=query, mode=mode)
-        if mode == PerplexityMode.COPILOT:
+    async def _create_account(self) -> PerplexityClient:
+        with TRACER.span("perplexity.create_client"):
+            if self._credentials_expired():
+                self._logger.info("[PERPLEXITY] Waiting for credentials for new client...")
+                await self._renew_once()
+                self._logger.info("[PERPLEXITY] Credentials fetched. Authenticating...")
+            else:
+                self._logger.info("[PERPLEXITY] Using existing credentials for new client. Authenticating...")
+            with TRACER.span("client.handshake"), PHASE_DURATION.time("handshake"):
+                client = await PerplexityClient(
+                    self._perplexity_auth.headers, self._perplexity_auth.cookies, base_url=get_settings().PERPLEXITY_URL
+                )
+            self._logger.info("[PERPLEXITY] Authenticated. Creating account...")
+            try:
+                with TRACER.span("client.create_account"), PHASE_DURATION.time("account_creation"):
+                    await client.create_account(
+                        self._emailnator_auth.headers,
+                        self._emailnator_auth.cookies,
+                        emailnator_url=get_settings().EMAILNATOR_URL,
+                        # without a ready mailbox in the reservoir, the client generates its own one
+                        mailbox=await self._mailboxes.get_ready(),
+                    )
+            except BaseException:
+                await client.close()
+                raise
+            self._logger.info("[PERPLEXITY] Account created.")
+            return client
+
+    async def _stock_accounts(self) -> None:
+        """
+        Keeps inventory of created accounts in the broker, while this worker holds the inventory lease.
+        """
+        settings = get_settings()
+        while True:
+            try:
+                stocking = (
+                    await asyncio.to_thread(
+                        self._broker.acquire_lease, "inventory", self._worker_id, INVENTORY_LEASE_TTL
+                    )
+                    and await asyncio.to_thread(self._broker.accounts_ready) < settings.PERPLEXITY_BROKER_INVENTORY_SIZE
+                )
+                if not stocking:
+                    await asyncio.sleep(5)
+                    continue
+                client = await self._create_account()
+                try:
+                    await asyncio.to_thread(
+                        self._broker.push_account,
+                        dict(client.session.headers),
+                        cookiejar_to_dict(client.session.cookie_jar),
+                        client.copilot,
+                        client.file_upload,
+                    )
+                finally:
+                    await client.close()
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("[PERPLEXITY] Failed to stock account, retrying in 5 seconds.")
+                await asyncio.sleep(5)
+
+    async def _create_mailbox(self) -> Emailnator:
+        if self._credentials_expired():
+            await self._renew_once()
+        with TRACER.span("emailnator.create_mailbox"):
+            return await Emailnator(
+                self._emailnator_auth.headers,
+                self._emailnator_auth.cookies,
+                dot=False,
+                google_mail=True,
+                base_url=get_settings().EMAILNATOR_URL,
+            )
+
+    async def _acquire_shared_client(self) -> PerplexityClient:
+        async with self._shared_client_lock:
+            if self._shared_client is None or self._pool.is_stale(self._shared_client):
+                previous, self._shared_client = self._shared_client, await self._pool.get()
+                self._shared_client_users[self._shared_client] = 0
+                if previous and not self._shared_client_users[previous]:
+                    del self._shared_client_users[previous]
+                    await previous.close()
+            self._shared_client_users[self._shared_client] += 1
+            return self._shared_client
+
+    async def _release_client(self, client: PerplexityClient) -> None:
+        if client not in self._shared_client_users:
+            await client.close()
+            return
+        self._shared_client_users[client] -= 1
+        # replaced shared client is closed after its last query is finished
+        if client is not self._shared_client and not self._shared_client_users[client]:
+            del self._shared_client_users[client]
+            await client.close()
+
+    async def ask_stream(
+        self, query: str, mode: PerplexityMode, focus: PerplexityFocus = PerplexityFocus.INTERNET
+    ) -> AsyncIterator[dict]:
+        """
+        Yields every step of the answer as soon as it arrives, the last one is the final answer.
+        """
+        with TRACER.span("perplexity.acquire_client", pool_ready=self._pool.ready):
+            if mode == PerplexityMode.CONCISE:
+                client = await self._acquire_shared_client()
+            else:
+                client = await self._pool.get()
+        REQUESTS.inc(mode.value)
+        try:
+            with TRACER.span("client.search"), PHASE_DURATION.time("answer"):
+                async for response in client.search_stream(
+                    query=query, mode=mode, focus=focus, timeout=get_settings().PERPLEXITY_ANSWER_TIMEOUT
+                ):
+                    yield response
+        finally:
+            # the copilot is spent once the query is sent, even if the consumer stops reading early
+            try:
+                if mode == PerplexityMode.COPILOT:
+                    await self._use_copilot()
+            finally:
+                await self._release_client(client)
+
+    async def _use_copilot(self) -> None:
+        if self._broker is not None:
+            self.copilots_left = await asyncio.to_thread(self._broker.use_copilot)
+        else:
             self.copilots_left -= 1
-        await client.session.close()
-        client.ws.close()
-        del client
-        self.status = PerplexityStatus.READY
+
+    async def _ask(self, query: str, mode: PerplexityMode, focus: PerplexityFocus) -> dict:
+        with TRACER.span("perplexity.admission"):
+            started = await self.admission.acquire()
+        response = None
+        try:
+            async for response in self.ask_stream(query, mode, focus):
+                pass
+        finally:
+            self.admission.release(started)
+        if response is None:
+            raise RuntimeError("Perplexity returned no answer")
         return response
+
+    async def ask(
+        self,
+        query: str,
+        mode: PerplexityMode,
+        focus: PerplexityFocus = PerplexityFocus.INTERNET,
+        cache: PerplexityCachePolicy = PerplexityCachePolicy.USE,
+    ) -> dict:
+        key = (normalize_query(query), mode.value, focus.value)
+        with TRACER.span(
+            "perplexity.ask", kind=TraceKind.REQUEST.value, mode=mode.value, focus=focus.value, cache=cache.value
+        ) as span:
+            if cache == PerplexityCachePolicy.USE:
+                response = await self.cache.get(key)
+                span.set_attribute("cache_hit", response is not None)
+                if response is not None:
+                    return response
+            response = await self.coalescer.run(key, lambda: self._ask(query, mode, focus))
+            if cache != PerplexityCachePolicy.BYPASS:
+                await self.cache.set(key, response, mode.value)
+            return response
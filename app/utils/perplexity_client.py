@@ -5,14 +5,17 @@
 
 
 import asyncio
-import json
 import random
-from threading import Thread
+from time import monotonic
 from uuid import uuid4
 
 import aiohttp
 from bs4 import BeautifulSoup
-from websocket import WebSocketApp
+
+from .codec import FrameTemplate, Slot, loads
+from .sessions import create_session
+from .tracing import TRACER
+from .transport import EngineIOSocket
 
 
 # utility function for parsing HTML content - using BeautifulSoup, lxml parser
@@ -54,14 +57,32 @@ class AsyncMixin:
 
 # client class for emailnator
 class Emailnator(AsyncMixin):
-    async def __ainit__(self, headers, cookies, domain=False, plus=False, dot=True, google_mail=False):
+    async def __ainit__(
+        self,
+        headers,
+        cookies,
+        domain=False,
+        plus=False,
+        dot=True,
+        google_mail=False,
+        base_url="https://www.emailnator.com/",
+    ):
+        self.base_url = base_url
+        self.created_at = monotonic()
         # inbox_ads for exclude the advertisements when you create a new mail
         self.inbox = []
         self.inbox_ads = []
 
         # create session with provided headers & cookies
-        self.s = aiohttp.ClientSession(headers=headers, cookies=cookies)
-
+        self.s = create_session(headers, cookies)
+        try:
+            await self._generate(domain, plus, dot, google_mail)
+        except BaseException:
+            await self.s.close()
+            raise
+
+    # generate new email address and remember advertisements already present in its inbox
+    async def _generate(self, domain, plus, dot, google_mail):
         # preparing data for email generation
         data = {"email": []}
         if domain:
@@ -74,31 +95,41 @@ class Emailnator(AsyncMixin):
             data["email"].append("googleMail")
 
         # generate temporary email address
-        self.email = (await (await self.s.post("https://www.emailnator.com/generate-email", json=data)).json())[
+        self.email = (await (await self.s.post(f"{self.base_url}generate-email", json=data)).json(loads=loads))[
             "email"
         ][0]
 
         # append advertisements to inbox_ads
         for ads in (
-            await (await self.s.post("https://www.emailnator.com/message-list", json={"email": self.email})).json()
+            await (await self.s.post(f"{self.base_url}message-list", json={"email": self.email})).json(loads=loads)
         )["messageData"]:
             self.inbox_ads.append(ads["messageID"])
 
-    # reload inbox messages
-    async def reload(self, wait=False, retry_timeout=5):
+    # reload inbox messages, when waiting poll often at first and back off, because mails usually arrive quickly
+    async def reload(self, wait=False, timeout=60, min_delay=0.25, max_delay=5):
         self.new_msgs = []
 
-        while True:
-            for msg in (
-                await (await self.s.post("https://www.emailnator.com/message-list", json={"email": self.email})).json()
-            )["messageData"]:
-                if msg["messageID"] not in self.inbox_ads and msg not in self.inbox:
-                    self.new_msgs.append(msg)
+        with TRACER.span("emailnator.reload", wait=wait) as span:
+            polls = 0
+            delay = min_delay
+            deadline = monotonic() + timeout
+            while True:
+                polls += 1
+                span.set_attribute("polls", polls)
+                for msg in (
+                    await (await self.s.post(f"{self.base_url}message-list", json={"email": self.email})).json(
+                        loads=loads
+                    )
+                )["messageData"]:
+                    if msg["messageID"] not in self.inbox_ads and msg not in self.inbox:
+                        self.new_msgs.append(msg)
 
-            if wait and not self.new_msgs:
-                await asyncio.sleep(retry_timeout)
-            else:
-                break
+                if not wait or self.new_msgs:
+                    break
+                if monotonic() + delay > deadline:
+                    raise asyncio.TimeoutError(f"No messages received in {timeout} seconds")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, max_delay)
 
         self.inbox += self.new_msgs
         return self.new_msgs
@@ -106,32 +137,46 @@ class Emailnator(AsyncMixin):
     # open selected inbox message
     async def open(self, msg_id):
         return await (
-            await self.s.post(
-                "https://www.emailnator.com/message-list", json={"email": self.email, "messageID": msg_id}
-            )
+            await self.s.post(f"{self.base_url}message-list", json={"email": self.email, "messageID": msg_id})
         ).text()
 
+    # check if the mailbox can still be used
+    @property
+    def closed(self):
+        return self.s.closed
+
+    # close http session
+    async def close(self):
+        await self.s.close()
+
 
 # client class for interactions with perplexity ai webpage
 class Client(AsyncMixin):
-    async def __ainit__(self, headers, cookies):
-        self.session = aiohttp.ClientSession(headers=headers, cookies=cookies)
-
-        await self.session.get(f"https://www.perplexity.ai/search/{str(uuid4())}")
+    async def __ainit__(self, headers, cookies, base_url="https://www.perplexity.ai/"):
+        self.base_url = base_url
+        self.session = create_session(headers, cookies)
+        self.created_at = monotonic()
+        self.ws = None
+        try:
+            await self._init_session()
+        except BaseException:
+            await self.close()
+            raise
+
+    # open search page and socket.io session
+    async def _init_session(self):
+        (await self.session.get(f"{self.base_url}search/{str(uuid4())}")).release()
 
         # generate random values for session init
         self.t = format(random.getrandbits(32), "08x")
-        self.sid = json.loads(
-            (
-                await (
-                    await self.session.get(f"https://www.perplexity.ai/socket.io/?EIO=4&transport=polling&t={self.t}")
-                ).text()
-            )[1:]
+        self.sid = loads(
+            (await (await self.session.get(f"{self.base_url}socket.io/?EIO=4&transport=polling&t={self.t}")).text())[1:]
         )["sid"]
         self.frontend_uuid = str(uuid4())
         self.frontend_session_id = str(uuid4())
-        self._last_answer = None
-        self._last_file_upload_info = None
+        self._build_templates()
+        # in-flight requests: queues of replies from the websocket, keyed by socket.io ack id
+        self._pending = {}
         self.copilot = 0
         self.file_upload = 0
         self.n = 1
@@ -139,111 +184,215 @@ class Client(AsyncMixin):
         assert (
             await (
                 await self.session.post(
-                    f"https://www.perplexity.ai/socket.io/?EIO=4&transport=polling&t={self.t}&sid={self.sid}",
+                    f"{self.base_url}socket.io/?EIO=4&transport=polling&t={self.t}&sid={self.sid}",
                     data='40{"jwt":"anonymous-ask-user"}',
                 )
             ).text()
         ) == "OK"
 
         # setup websocket communication
-        self.ws = WebSocketApp(
-            url=f"wss://www.perplexity.ai/socket.io/?EIO=4&transport=websocket&sid={self.sid}",
-            cookie="; ".join([f"{x}={y}" for x, y in cookiejar_to_dict(self.session.cookie_jar).items()]),
-            header={"user-agent": self.session.headers["user-agent"]},
-            on_open=lambda ws: ws.send("2probe"),
-            on_message=self.on_message,
-            on_error=lambda ws, err: print(f"Error: {err}"),
-        )
-
-        # start webSocket thread
-        Thread(target=self.ws.run_forever).start()
-        await asyncio.sleep(1)
+        await self._connect_websocket()
 
     # method to create an account on the webpage
-    async def create_account(self, headers, cookies):
-        emailnator_cli = await Emailnator(headers, cookies, dot=False, google_mail=True)
-
-        # send sign in link to email
-        resp = await self.session.post(
-            "https://www.perplexity.ai/api/auth/signin/email",
-            data={
-                "email": emailnator_cli.email,
-                "csrfToken": cookiejar_to_dict(self.session.cookie_jar)["next-auth.csrf-token"].split("%")[0],
-                "callbackUrl": "https://www.perplexity.ai/",
-                "json": "true",
-            },
+    # mailbox could be generated beforehand, otherwise a new one is generated
+    async def create_account(self, headers, cookies, emailnator_url="https://www.emailnator.com/", mailbox=None):
+        emailnator_cli = mailbox or await Emailnator(
+            headers, cookies, dot=False, google_mail=True, base_url=emailnator_url
         )
 
-        if resp.ok:
+        # mailbox is used once and closed whatever happens
+        try:
+            # send sign in link to email
+            resp = await self.session.post(
+                f"{self.base_url}api/auth/signin/email",
+                data={
+                    "email": emailnator_cli.email,
+                    "csrfToken": cookiejar_to_dict(self.session.cookie_jar)["next-auth.csrf-token"].split("%")[0],
+                    "callbackUrl": self.base_url,
+                    "json": "true",
+                },
+            )
+            resp.release()
+            if not resp.ok:
+                return
+
             # get the link from mail and open, you will be signed in directly when you open link
             new_msgs = await emailnator_cli.reload(wait=True)
             new_account_link = souper(await emailnator_cli.open(new_msgs[0]["messageID"])).select("a")[1].get("href")
-            await emailnator_cli.s.close()
-
-            await self.session.get(new_account_link)
-            await self.session.get("https://www.perplexity.ai/")
-
-            self.copilot = 5
-            self.file_upload = 3
-
-            self.ws.close()
-
-            # generate random values for session init
-            self.t = format(random.getrandbits(32), "08x")
-            self.sid = json.loads(
-                (
-                    await (
-                        await self.session.get(
-                            f"https://www.perplexity.ai/socket.io/?EIO=4&transport=polling&t={self.t}"
-                        )
-                    ).text()
-                )[1:]
-            )["sid"]
-
-            assert (
-                await (
-                    await self.session.post(
-                        f"https://www.perplexity.ai/socket.io/?EIO=4&transport=polling&t={self.t}&sid={self.sid}",
-                        data='40{"jwt":"anonymous-ask-user"}',
-                    )
-                ).text()
-            ) == "OK"
-
-            # reconfig - WebSocket communication
-            self.ws = WebSocketApp(
-                url=f"wss://www.perplexity.ai/socket.io/?EIO=4&transport=websocket&sid={self.sid}",
-                cookie="; ".join([f"{x}={y}" for x, y in cookiejar_to_dict(self.session.cookie_jar).items()]),
-                header={"user-agent": self.session.headers["user-agent"]},
-                on_open=lambda ws: ws.send("2probe"),
-                on_message=self.on_message,
-                on_error=lambda ws, err: print(f"Error: {err}"),
-            )
+        finally:
+            await emailnator_cli.close()
+
+        (await self.session.get(new_account_link)).release()
+        (await self.session.get(self.base_url)).release()
+
+        self.copilot = 5
+        self.file_upload = 3
+
+        await self.ws.close()
+
+        # generate random values for session init
+        self.t = format(random.getrandbits(32), "08x")
+        self.sid = loads(
+            (await (await self.session.get(f"{self.base_url}socket.io/?EIO=4&transport=polling&t={self.t}")).text())[1:]
+        )["sid"]
+
+        assert (
+            await (
+                await self.session.post(
+                    f"{self.base_url}socket.io/?EIO=4&transport=polling&t={self.t}&sid={self.sid}",
+                    data='40{"jwt":"anonymous-ask-user"}',
+                )
+            ).text()
+        ) == "OK"
+
+        # reconfig - WebSocket communication
+        await self._connect_websocket()
+
+        return True
+
+    # pre-serialize outgoing events, only the query and ids change between them
+    def _build_templates(self):
+        self._ask_template = FrameTemplate(
+            [
+                "perplexity_ask",
+                Slot("query"),
+                {
+                    "attachments": Slot("attachments"),
+                    "version": "2.1",
+                    "source": "default",
+                    "mode": Slot("mode"),
+                    "last_backend_uuid": Slot("last_backend_uuid"),
+                    "read_write_token": "",
+                    "conversational_enabled": True,
+                    "frontend_session_id": self.frontend_session_id,
+                    "search_focus": Slot("search_focus"),
+                    "frontend_uuid": self.frontend_uuid,
+                    "gpt4": False,
+                    "language": "en-US",
+                },
+            ]
+        )
+        self._step_template = FrameTemplate(
+            [
+                "perplexity_step",
+                Slot("query"),
+                {
+                    "version": "2.1",
+                    "source": "default",
+                    "attachments": Slot("attachments"),
+                    "last_backend_uuid": Slot("backend_uuid"),
+                    "existing_entry_uuid": Slot("backend_uuid"),
+                    "read_write_token": "",
+                    "search_focus": Slot("search_focus"),
+                    "frontend_uuid": self.frontend_uuid,
+                    "step_payload": Slot("step_payload"),
+                },
+            ]
+        )
+        self._upload_template = FrameTemplate(
+            ["get_upload_url", {"version": "2.1", "source": "default", "content_type": Slot("content_type")}]
+        )
 
-            # start WebSocket thread
-            Thread(target=self.ws.run_forever).start()
-            await asyncio.sleep(1)
+    # open websocket for the current socket.io session
+    async def _connect_websocket(self):
+        # set by on_close, requests registered afterwards fail right away
+        self._ws_closed = False
+        self.ws = EngineIOSocket(
+            # https:// -> wss://, http:// -> ws://
+            url=f"ws{self.base_url.removeprefix('http')}socket.io/?EIO=4&transport=websocket&sid={self.sid}",
+            headers={
+                "cookie": "; ".join([f"{x}={y}" for x, y in cookiejar_to_dict(self.session.cookie_jar).items()]),
+                "user-agent": self.session.headers["user-agent"],
+            },
+            on_message=self.on_message,
+            on_close=self.on_close,
+        )
+        await self.ws.connect()
 
-            return True
+    # check if the client can still be used for searching
+    @property
+    def closed(self):
+        return self.session.closed or self.ws.closed
 
-    # message handler function for Websocket
-    def on_message(self, ws, message):
-        if message == "2":
-            ws.send("3")
-        elif message == "3probe":
-            ws.send("5")
+    # close websocket and http session
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        await self.session.close()
 
-        if message.startswith(str(430 + self.n)):
-            response = json.loads(message[3:])[0]
+    # allocate ack id for a new request, so several requests can share the websocket
+    def _next_ack_id(self):
+        self.n += 1
+        return self.n
+
+    # register a queue for replies to the given ack id, must be called before sending the request
+    def _expect(self, ack_id):
+        self._pending[ack_id] = asyncio.Queue()
+        if self._ws_closed:
+            self._pending[ack_id].put_nowait(ConnectionError("Websocket connection closed"))
+
+    # wait for the next reply to the given ack id
+    async def _receive(self, ack_id, timeout):
+        response = await asyncio.wait_for(self._pending[ack_id].get(), timeout)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    # stop collecting replies to the given ack id
+    def _forget(self, ack_id):
+        self._pending.pop(ack_id, None)
+
+    # pass the reply to the request waiting for it
+    def _resolve(self, ack_id, response):
+        replies = self._pending.get(ack_id)
+        if replies is not None:
+            replies.put_nowait(response)
+
+    # fail all pending requests once the websocket is gone
+    def on_close(self):
+        self._ws_closed = True
+        for replies in self._pending.values():
+            replies.put_nowait(ConnectionError("Websocket connection closed"))
+
+    # message handler function for Websocket, heartbeats are answered by the transport
+    def on_message(self, message):
+        # acknowledgement packets look like 43<ack id>[<payload>]
+        if message.startswith("43"):
+            start = message.index("[", 2)
+            response = loads(message[start:])[0]
 
             if "text" in response:
-                response["text"] = json.loads(response["text"])
-                self._last_answer = response
+                response["text"] = loads(response["text"])
+
+            self._resolve(int(message[2:start]), response)
+
+    # answer (or skip) the question ai asked while searching
+    async def _send_step(self, ack_id, query, focus, last_answer, step_type, content_type, content, input_uuid):
+        await self.ws.send(
+            f"42{ack_id}"
+            + self._step_template.render(
+                query=query,
+                attachments=last_answer["attachments"],
+                backend_uuid=last_answer["backend_uuid"],
+                search_focus=focus,
+                step_payload={
+                    "uuid": str(uuid4()),
+                    "step_type": step_type,
+                    "content": [{"content": content, "type": content_type, "uuid": input_uuid}],
+                },
+            )
+        )
 
-            else:
-                self._last_file_upload_info = response
+    # method to search on the webpage, returns the final answer
+    async def search(self, query, mode="concise", focus="internet", files=[], follow_up=None, solvers={}, timeout=120):
+        async for answer in self.search_stream(query, mode, focus, files, follow_up, solvers, timeout):
+            pass
+        return answer
 
-    # method to search on the webpage
-    async def search(self, query, mode="concise", focus="internet", files=[], follow_up=None, solvers={}):
+    # method to search on the webpage, yields every step of the answer as soon as it arrives, the last one is final
+    async def search_stream(
+        self, query, mode="concise", focus="internet", files=[], follow_up=None, solvers={}, timeout=120
+    ):
         assert mode in ["concise", "copilot"], 'Search modes --> ["concise", "copilot"]'
         assert focus in [
             "internet",
@@ -260,9 +409,6 @@ class Client(AsyncMixin):
 
         self.copilot = self.copilot - 1 if mode == "copilot" else self.copilot
         self.file_upload = self.file_upload - len(files) if files else self.file_upload
-        self.n += 1
-        self._last_answer = None
-        self._last_file_upload_info = None
 
         if files:
             if follow_up:
@@ -272,31 +418,27 @@ class Client(AsyncMixin):
 
             for file_id, file in enumerate(files):
                 # request an upload URL for a file
-                self.ws.send(
-                    f"{420 + self.n}"
-                    + json.dumps(
-                        [
-                            "get_upload_url",
-                            {
-                                "version": "2.1",
-                                "source": "default",
-                                "content_type": {"txt": "text/plain", "pdf": "application/pdf"}[file[1]],
-                            },
-                        ]
+                upload_id = self._next_ack_id()
+                self._expect(upload_id)
+                await self.ws.send(
+                    f"42{upload_id}"
+                    + self._upload_template.render(
+                        content_type={"txt": "text/plain", "pdf": "application/pdf"}[file[1]]
                     )
                 )
 
                 # wait for response
-                while not self._last_file_upload_info:
-                    pass
-                self.n += 1
+                try:
+                    file_upload_info = await self._receive(upload_id, timeout)
+                finally:
+                    self._forget(upload_id)
 
-                if not self._last_file_upload_info["success"]:
-                    raise Exception("File upload error", self._last_file_upload_info)
+                if not file_upload_info["success"]:
+                    raise Exception("File upload error", file_upload_info)
 
                 # aiohttp's own multipart encoder
                 with aiohttp.MultipartWriter("form-data") as mp:
-                    for field_name, field_value in self._last_file_upload_info["fields"].items():
+                    for field_name, field_value in file_upload_info["fields"].items():
                         part = mp.append(field_value)
                         part.set_content_disposition("form-data", name=field_name)
 
@@ -306,233 +448,107 @@ class Client(AsyncMixin):
                     part.set_content_disposition("form-data", name="file", filename=f"myfile{file_id}")
 
                     upload_resp = await self.session.post(
-                        self._last_file_upload_info["url"], data=mp, headers={"Content-Type": mp.content_type}
+                        file_upload_info["url"], data=mp, headers={"Content-Type": mp.content_type}
                     )
 
+                upload_resp.release()
                 if not upload_resp.ok:
                     raise Exception("File upload error", upload_resp)
 
                 uploaded_files.append(
-                    self._last_file_upload_info["url"]
-                    + self._last_file_upload_info["fields"]["key"].replace("${filename}", f"myfile{file_id}")
+                    file_upload_info["url"]
+                    + file_upload_info["fields"]["key"].replace("${filename}", f"myfile{file_id}")
                 )
 
             # send search request with uploaded files as attachments
-            self.ws.send(
-                f"{420 + self.n}"
-                + json.dumps(
-                    [
-                        "perplexity_ask",
-                        query,
-                        {
-                            "attachments": uploaded_files,
-                            "version": "2.1",
-                            "source": "default",
-                            "mode": mode,
-                            "last_backend_uuid": None,
-                            "read_write_token": "",
-                            "conversational_enabled": True,
-                            "frontend_session_id": self.frontend_session_id,
-                            "search_focus": focus,
-                            "frontend_uuid": self.frontend_uuid,
-                            "gpt4": False,
-                            "language": "en-US",
-                        },
-                    ]
+            ack_id = self._next_ack_id()
+            self._expect(ack_id)
+            await self.ws.send(
+                f"42{ack_id}"
+                + self._ask_template.render(
+                    query=query, attachments=uploaded_files, mode=mode, last_backend_uuid=None, search_focus=focus
                 )
             )
 
         # send search request without file
         else:
-            self.ws.send(
-                f"{420 + self.n}"
-                + json.dumps(
-                    [
-                        "perplexity_ask",
-                        query,
-                        {
-                            "attachments": follow_up["attachments"] if follow_up else None,
-                            "version": "2.1",
-                            "source": "default",
-                            "mode": mode,
-                            "last_backend_uuid": follow_up["backend_uuid"] if follow_up else None,
-                            "read_write_token": "",
-                            "conversational_enabled": True,
-                            "frontend_session_id": self.frontend_session_id,
-                            "search_focus": focus,
-                            "frontend_uuid": self.frontend_uuid,
-                            "gpt4": False,
-                            "language": "en-US",
-                        },
-                    ]
+            ack_id = self._next_ack_id()
+            self._expect(ack_id)
+            await self.ws.send(
+                f"42{ack_id}"
+                + self._ask_template.render(
+                    query=query,
+                    attachments=follow_up["attachments"] if follow_up else None,
+                    mode=mode,
+                    last_backend_uuid=follow_up["backend_uuid"] if follow_up else None,
+                    search_focus=focus,
                 )
             )
 
         # we will enter a loop here, ai will ask questions and prompt solvers will answer
-        while True:
-            while not self._last_answer:
-                pass
-
-            # if ai finished asking questions, return answer
-            if self._last_answer["step_type"] == "FINAL":
-                return self._last_answer
-
-            # if ai asking a question, use prompt solvers to answer
-            elif self._last_answer["step_type"] == "PROMPT_INPUT":
-                self.backend_uuid = self._last_answer["backend_uuid"]
-
-                for step_query in self._last_answer["text"][-1]["content"]["inputs"]:
-                    if step_query["type"] == "PROMPT_TEXT":
-                        solver = solvers.get("text", None)
-
-                        # use solver to answer if solver function is defined
-                        if solver:
-                            self.ws.send(
-                                f"{420 + self.n}"
-                                + json.dumps(
-                                    [
-                                        "perplexity_step",
-                                        query,
-                                        {
-                                            "version": "2.1",
-                                            "source": "default",
-                                            "attachments": self._last_answer["attachments"],
-                                            "last_backend_uuid": self.backend_uuid,
-                                            "existing_entry_uuid": self.backend_uuid,
-                                            "read_write_token": "",
-                                            "search_focus": focus,
-                                            "frontend_uuid": self.frontend_uuid,
-                                            "step_payload": {
-                                                "uuid": str(uuid4()),
-                                                "step_type": "USER_INPUT",
-                                                "content": [
-                                                    {
-                                                        "content": {
-                                                            "text": (
-                                                                await solver(step_query["content"]["description"])
-                                                            )[:2000]
-                                                        },
-                                                        "type": "USER_TEXT",
-                                                        "uuid": step_query["uuid"],
-                                                    }
-                                                ],
-                                            },
-                                        },
-                                    ]
-                                )
+        prompt_inputs = 0
+        try:
+            while True:
+                last_answer = await self._receive(ack_id, timeout)
+                yield last_answer
+
+                # if ai finished asking questions, the answer is complete
+                if last_answer["step_type"] == "FINAL":
+                    return
+
+                # if ai asking a question, use prompt solvers to answer
+                if last_answer["step_type"] == "PROMPT_INPUT":
+                    prompt_inputs += 1
+                    TRACER.set_attribute("prompt_inputs", prompt_inputs)
+
+                    for step_query in last_answer["text"][-1]["content"]["inputs"]:
+                        if step_query["type"] == "PROMPT_TEXT":
+                            solver = solvers.get("text", None)
+
+                            # use solver to answer if solver function is defined
+                            if solver:
+                                step_type = "USER_INPUT"
+                                content = {"text": (await solver(step_query["content"]["description"]))[:2000]}
+
+                            # skip the question if solver function is not defined
+                            else:
+                                step_type = "USER_SKIP"
+                                content = {"text": "Skipped"}
+
+                            await self._send_step(
+                                ack_id, query, focus, last_answer, step_type, "USER_TEXT", content, step_query["uuid"]
                             )
 
-                        # skip the question if solver function is not defined
-                        else:
-                            self.ws.send(
-                                f"{420 + self.n}"
-                                + json.dumps(
-                                    [
-                                        "perplexity_step",
-                                        query,
-                                        {
-                                            "version": "2.1",
-                                            "source": "default",
-                                            "attachments": self._last_answer["attachments"],
-                                            "last_backend_uuid": self.backend_uuid,
-                                            "existing_entry_uuid": self.backend_uuid,
-                                            "read_write_token": "",
-                                            "search_focus": focus,
-                                            "frontend_uuid": self.frontend_uuid,
-                                            "step_payload": {
-                                                "uuid": str(uuid4()),
-                                                "step_type": "USER_SKIP",
-                                                "content": [
-                                                    {
-                                                        "content": {"text": "Skipped"},
-                                                        "type": "USER_TEXT",
-                                                        "uuid": step_query["uuid"],
-                                                    }
-                                                ],
-                                            },
-                                        },
-                                    ]
-                                )
-                            )
-
-                    if step_query["type"] == "PROMPT_CHECKBOX":
-                        solver = solvers.get("checkbox", None)
+                        if step_query["type"] == "PROMPT_CHECKBOX":
+                            solver = solvers.get("checkbox", None)
 
-                        # use solver to answer if solver function is defined
-                        if solver:
-                            solver_answer = await solver(
-                                step_query["content"]["description"],
-                                {int(x["id"]): x["value"] for x in step_query["content"]["options"]},
-                            )
-
-                            self.ws.send(
-                                f"{420 + self.n}"
-                                + json.dumps(
-                                    [
-                                        "perplexity_step",
-                                        query,
-                                        {
-                                            "version": "2.1",
-                                            "source": "default",
-                                            "attachments": self._last_answer["attachments"],
-                                            "last_backend_uuid": self.backend_uuid,
-                                            "existing_entry_uuid": self.backend_uuid,
-                                            "read_write_token": "",
-                                            "search_focus": focus,
-                                            "frontend_uuid": self.frontend_uuid,
-                                            "step_payload": {
-                                                "uuid": str(uuid4()),
-                                                "step_type": "USER_INPUT",
-                                                "content": [
-                                                    {
-                                                        "content": {
-                                                            "options": [
-                                                                x
-                                                                for x in step_query["content"]["options"]
-                                                                if int(x["id"]) in solver_answer
-                                                            ]
-                                                        },
-                                                        "type": "USER_CHECKBOX",
-                                                        "uuid": step_query["uuid"],
-                                                    }
-                                                ],
-                                            },
-                                        },
-                                    ]
+                            # use solver to answer if solver function is defined
+                            if solver:
+                                solver_answer = await solver(
+                                    step_query["content"]["description"],
+                                    {int(x["id"]): x["value"] for x in step_query["content"]["options"]},
                                 )
-                            )
-
-                        # skip the question if solver function is not defined
-                        else:
-                            self.ws.send(
-                                f"{420 + self.n}"
-                                + json.dumps(
-                                    [
-                                        "perplexity_step",
-                                        query,
-                                        {
-                                            "version": "2.1",
-                                            "source": "default",
-                                            "attachments": self._last_answer["attachments"],
-                                            "last_backend_uuid": self.backend_uuid,
-                                            "existing_entry_uuid": self.backend_uuid,
-                                            "read_write_token": "",
-                                            "search_focus": focus,
-                                            "frontend_uuid": self.frontend_uuid,
-                                            "step_payload": {
-                                                "uuid": str(uuid4()),
-                                                "step_type": "USER_SKIP",
-                                                "content": [
-                                                    {
-                                                        "content": {"options": []},
-                                                        "type": "USER_CHECKBOX",
-                                                        "uuid": step_query["uuid"],
-                                                    }
-                                                ],
-                                            },
-                                        },
+                                step_type = "USER_INPUT"
+                                content = {
+                                    "options": [
+                                        x for x in step_query["content"]["options"] if int(x["id"]) in solver_answer
                                     ]
-                                )
+                                }
+
+                            # skip the question if solver function is not defined
+                            else:
+                                step_type = "USER_SKIP"
+                                content = {"options": []}
+
+                            await self._send_step(
+                                ack_id,
+                                query,
+                                focus,
+                                last_answer,
+                                step_type,
+                                "USER_CHECKBOX",
+                                content,
+                                step_query["uuid"],
                             )
-
-            self._last_answer = None
+        finally:
+            self._forget(ack_id)
@@ -0,0 +1,147 @@
+import asyncio
+from logging import getLogger
+from time import monotonic
+from typing import Awaitable, Callable, Generic, TypeVar
+
+from .perplexity_client import Client as PerplexityClient
+from .perplexity_client import Emailnator
+
+
+# anything with `closed`, `created_at` and `close()`
+PoolItem = TypeVar("PoolItem", PerplexityClient, Emailnator)
+
+
+class ClientPool(Generic[PoolItem]):
+    """
+    Keeps a number of ready-to-use (authenticated, account created) clients.
+
+    Background producers refill the pool as soon as a client is taken out of it,
+    so the request only has to pop a client from the queue instead of creating one.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Awaitable[PoolItem]],
+        size: int,
+        max_age: int,
+        retry_timeout: int = 5,
+        wait_timeout: float | None = None,
+        name: str = "client",
+    ):
+        if size < 0:
+            raise ValueError(f"Size of {name} pool must not be negative, got {size}")
+        self._logger = getLogger("uvicorn.debug")
+        self._name = name
+        self._factory = factory
+        self._size = size
+        self._max_age = max_age
+        self._retry_timeout = retry_timeout
+        self._wait_timeout = wait_timeout
+        # reported to waiters which haven't got a client in time, reset by the first successful one
+        self._last_error: Exception | None = None
+        self._clients: asyncio.Queue[PoolItem] = asyncio.Queue()
+        self._free_slots = asyncio.Semaphore(size)
+        self._producers: list[asyncio.Task] = []
+
+    @property
+    def ready(self) -> int:
+        return self._clients.qsize()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def start(self) -> None:
+        if self._producers:
+            return
+        self._producers = [asyncio.create_task(self._produce()) for _ in range(self._size)]
+        self._producers.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        for producer in self._producers:
+            producer.cancel()
+        await asyncio.gather(*self._producers, return_exceptions=True)
+        self._producers = []
+        while not self._clients.empty():
+            await self._clients.get_nowait().close()
+        self._free_slots = asyncio.Semaphore(self._size)
+
+    def is_stale(self, client: PoolItem) -> bool:
+        return client.closed or monotonic() - client.created_at > self._max_age
+
+    async def get(self) -> PoolItem:
+        # nothing is prepared beforehand when the pool is disabled
+        if self._size == 0:
+            return await self._factory()
+        self.start()
+        while True:
+            try:
+                client = await asyncio.wait_for(self._clients.get(), timeout=self._wait_timeout)
+            except asyncio.TimeoutError as exc:
+                raise RuntimeError(
+                    f"No {self._name} became ready in {self._wait_timeout} seconds"
+                ) from self._last_error or exc
+            self._free_slots.release()
+            if not self.is_stale(client):
+                return client
+            self._logger.info("[POOL] Dropping stale %s.", self._name)
+            await client.close()
+
+    async def get_ready(self) -> PoolItem | None:
+        """
+        Returns a ready item without waiting for one, or None if there is none.
+        """
+        self.start()
+        while True:
+            try:
+                client = self._clients.get_nowait()
+            except asyncio.QueueEmpty:
+                return None
+            self._free_slots.release()
+            if not self.is_stale(client):
+                return client
+            self._logger.info("[POOL] Dropping stale %s.", self._name)
+            await client.close()
+
+    async def _sweep(self) -> None:
+        # idle clients go stale too, so they are periodically checked and replaced
+        while True:
+            await asyncio.sleep(min(self._max_age, 60))
+            try:
+                await self._drop_stale()
+            except Exception:  # pylint: disable=broad-except
+                self._logger.exception("[POOL] Failed to drop stale %s.", self._name)
+
+    async def _drop_stale(self) -> None:
+        # stale clients are taken out before closing any, requests may take clients while one is being closed
+        stale = []
+        for _ in range(self._clients.qsize()):
+            client = self._clients.get_nowait()
+            if self.is_stale(client):
+                self._free_slots.release()
+                stale.append(client)
+            else:
+                self._clients.put_nowait(client)
+        for client in stale:
+            self._logger.info("[POOL] Dropping stale %s.", self._name)
+            await client.close()
+
+    async def _produce(self) -> None:
+        while True:
+            await self._free_slots.acquire()
+            try:
+                client = await self._factory()
+            except asyncio.CancelledError:
+                self._free_slots.release()
+                raise
+            except Exception as exc:  # pylint: disable=broad-except
+                self._logger.exception(
+                    "[POOL] Failed to prepare %s, retrying in %d seconds.", self._name, self._retry_timeout
+                )
+                self._last_error = exc
+                self._free_slots.release()
+                await asyncio.sleep(self._retry_timeout)
+                continue
+            self._last_error = None
+            self._clients.put_nowait(client)
+            self._logger.info("[POOL] %s ready (%d/%d).", self._name.capitalize(), self.ready, self._size)
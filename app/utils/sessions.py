@@ -0,0 +1,74 @@
+import asyncio
+from weakref import WeakKeyDictionary
+
+import aiohttp
+import httpx
+
+from app.config import get_settings
+
+
+# connection pools are bound to the event loop, so there is one per loop (main one and the renewal thread)
+_connectors: "WeakKeyDictionary[asyncio.AbstractEventLoop, aiohttp.TCPConnector]" = WeakKeyDictionary()
+_httpx_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = WeakKeyDictionary()
+
+
+def _shared_connector() -> aiohttp.TCPConnector:
+    loop = asyncio.get_running_loop()
+    connector = _connectors.get(loop)
+    if connector is None or connector.closed:
+        settings = get_settings()
+        connector = aiohttp.TCPConnector(
+            limit=settings.HTTP_POOL_LIMIT,
+            limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+            keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+        )
+        _connectors[loop] = connector
+    return connector
+
+
+def create_session(headers: dict[str, str], cookies: dict[str, str]) -> aiohttp.ClientSession:
+    """
+    Creates session with its own cookie jar on top of the process-wide connection pool,
+    so accounts stay isolated while TCP and TLS connections are reused.
+    """
+    return aiohttp.ClientSession(
+        connector=_shared_connector(),
+        connector_owner=False,
+        cookie_jar=aiohttp.CookieJar(),
+        headers=headers,
+        cookies=cookies,
+    )
+
+
+def shared_httpx_client() -> httpx.AsyncClient:
+    """
+    Returns process-wide client for cookie-less API calls (e.g. Capmonster), it must not be closed by the caller.
+    """
+    loop = asyncio.get_running_loop()
+    client = _httpx_clients.get(loop)
+    if client is None or client.is_closed:
+        settings = get_settings()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_LIMIT,
+                max_keepalive_connections=settings.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_TIMEOUT,
+            ),
+            timeout=30,
+        )
+        _httpx_clients[loop] = client
+    return client
+
+
+async def close_shared_sessions() -> None:
+    """
+    Closes connection pools of the current event loop.
+    """
+    loop = asyncio.get_running_loop()
+    connector = _connectors.pop(loop, None)
+    if connector is not None:
+        await connector.close()
+    client = _httpx_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
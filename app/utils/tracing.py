@@ -0,0 +1,117 @@
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from time import time
+from typing import Any, Callable, Iterator
+from uuid import uuid4
+
+from app.config import get_settings
+
+
+class Span:
+    def __init__(self, name: str, parent: "Span | None" = None, attributes: dict[str, Any] | None = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid4().hex
+        self.parent = parent
+        self.attributes: dict[str, Any] = attributes or {}
+        self.children: list[Span] = []
+        self.start = time()
+        self.end: float | None = None
+        if parent:
+            parent.children.append(self)
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time()) - self.start
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "start": self.start,
+            "duration": self.duration,
+            "attributes": self.attributes,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+class SpanSink(ABC):
+    """
+    Receives every finished root span together with all of its children.
+    """
+
+    @abstractmethod
+    def export(self, span: Span) -> None:
+        pass
+
+
+class RingBufferSink(SpanSink):
+    """
+    Keeps the most recent traces in memory.
+    """
+
+    def __init__(self, size: int):
+        self._traces: deque[Span] = deque(maxlen=size)
+        self._lock = Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._traces.append(span)
+
+    def slowest(self, limit: int, predicate: Callable[[Span], bool] | None = None) -> list[Span]:
+        with self._lock:
+            traces = [span for span in self._traces if predicate is None or predicate(span)]
+        return sorted(traces, key=lambda span: span.duration, reverse=True)[:limit]
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+
+
+class Tracer:
+    def __init__(self, sinks: list[SpanSink] | None = None):
+        self.sinks: list[SpanSink] = sinks or []
+
+    def add_sink(self, sink: SpanSink) -> None:
+        self.sinks.append(sink)
+
+    @staticmethod
+    def current_span() -> Span | None:
+        return _current_span.get()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """
+        Sets attribute of the current span, if there is one.
+        """
+        span = _current_span.get()
+        if span:
+            span.set_attribute(key, value)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """
+        Starts span as a child of the current one, or as a root of a new trace.
+        """
+        parent = _current_span.get()
+        span = Span(name, parent, attributes)
+        _current_span.set(span)
+        try:
+            yield span
+        except BaseException as exc:
+            span.set_attribute("error", repr(exc))
+            raise
+        finally:
+            span.end = time()
+            # not reset by token: span may be finished from another context (e.g. closed async generator)
+            _current_span.set(parent)
+            if parent is None:
+                for sink in self.sinks:
+                    sink.export(span)
+
+
+TRACE_BUFFER = RingBufferSink(size=get_settings().TRACING_BUFFER_SIZE)
+TRACER = Tracer(sinks=[TRACE_BUFFER])
@@ -0,0 +1,90 @@
+import asyncio
+from logging import getLogger
+from typing import Callable
+
+from websockets.client import WebSocketClientProtocol, connect
+from websockets.exceptions import ConnectionClosedError
+
+from .metrics import WEBSOCKET_CONNECTIONS, WEBSOCKET_ERRORS
+
+
+class EngineIOSocket:
+    """
+    Engine.IO websocket transport running in the current event loop.
+
+    Performs the polling -> websocket upgrade, answers server heartbeats and passes
+    every other packet to `on_message`. `on_close` is called once the connection is gone.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        headers: dict[str, str],
+        on_message: Callable[[str], None],
+        on_close: Callable[[], None] | None = None,
+    ):
+        self._logger = getLogger("uvicorn.debug")
+        self._url = url
+        self._headers = headers
+        self._on_message = on_message
+        self._on_close = on_close
+        self._connection: WebSocketClientProtocol | None = None
+        self._reader: asyncio.Task | None = None
+        self._upgraded = asyncio.Event()
+
+    @property
+    def closed(self) -> bool:
+        return self._connection is None or self._connection.closed or self._reader.done()
+
+    async def connect(self, timeout: float = 10) -> None:
+        headers = dict(self._headers)
+        user_agent = headers.pop("user-agent", None)
+        self._connection = await connect(
+            self._url,
+            extra_headers=headers,
+            user_agent_header=user_agent,
+            # heartbeats are handled on the Engine.IO level
+            ping_interval=None,
+            max_size=None,
+            open_timeout=timeout,
+        )
+        WEBSOCKET_CONNECTIONS.inc()
+        self._reader = asyncio.create_task(self._read())
+        await self._connection.send("2probe")
+        try:
+            await asyncio.wait_for(self._upgraded.wait(), timeout)
+        except asyncio.TimeoutError:
+            await self.close()
+            raise
+
+    async def send(self, message: str) -> None:
+        await self._connection.send(message)
+
+    async def close(self) -> None:
+        if self._reader:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+        if self._connection:
+            await self._connection.close()
+
+    async def _read(self) -> None:
+        try:
+            async for message in self._connection:
+                if message == "2":
+                    await self._connection.send("3")
+                elif message == "3probe":
+                    await self._connection.send("5")
+                    self._upgraded.set()
+                else:
+                    try:
+                        self._on_message(message)
+                    except Exception:  # pylint: disable=broad-except
+                        WEBSOCKET_ERRORS.inc()
+                        self._logger.exception("[WEBSOCKET] Failed to handle message: %.200s", message)
+        except ConnectionClosedError as exc:
+            WEBSOCKET_ERRORS.inc()
+            self._logger.warning("[WEBSOCKET] Connection closed with error: %s", exc)
+        finally:
+            WEBSOCKET_CONNECTIONS.dec()
+            if self._on_close:
+                self._on_close()
@@ -0,0 +1,82 @@
+"""
+Benchmarks of the application running in-process against the local simulator of upstream services:
+
+    python -m benchmarks --output bench_results.json --baseline benchmarks/baseline.json
+
+Exits with non-zero code if any metric is worse than baseline by more than the threshold.
+"""
+
+import asyncio
+import os
+import socket
+import sys
+from argparse import ArgumentParser
+from tempfile import TemporaryDirectory
+
+from aiohttp import web
+
+
+def parse_args():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default="bench_results.json", help="where to write results")
+    parser.add_argument("--baseline", default="", help="results to compare with, e.g. benchmarks/baseline.json")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression, 0.2 is 20%%")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--iterations", type=int, default=20000, help="iterations of every micro-benchmark")
+    parser.add_argument("--answer-latency", type=float, default=0.05, help="simulated answer latency, seconds")
+    return parser.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("localhost", 0))
+        return sock.getsockname()[1]
+
+
+async def main(args) -> int:
+    # settings are read from environment on import, so the application is imported after it's configured
+    # pylint: disable=import-outside-toplevel
+    port = _free_port()
+    workdir = TemporaryDirectory()
+    from app.simulator import SimulatorConfig, create_app, service_urls
+    from app.simulator.__main__ import seed_credentials
+
+    credentials_file = os.path.join(workdir.name, "credentials.json")
+    seed_credentials(credentials_file)
+    os.environ.update(service_urls("localhost", port))
+    os.environ.update(
+        PERPLEXITY_CREDENTIALS_FILE=credentials_file,
+        PERPLEXITY_CACHE_FILE="",
+        PERPLEXITY_MAX_QUEUE=str(max(int(level) for level in args.concurrency.split(",")) * 2),
+    )
+
+    from .ask import run_ask_benchmark
+    from .micro import run_micro_benchmarks
+    from .report import Report, compare
+
+    runner = web.AppRunner(create_app(SimulatorConfig(answer_latency=args.answer_latency, email_delay=0.01)))
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", port).start()
+    report = Report()
+    try:
+        run_micro_benchmarks(report, args.iterations)
+        await run_ask_benchmark(report, [int(level) for level in args.concurrency.split(",")], args.requests)
+    finally:
+        await runner.cleanup()
+        workdir.cleanup()
+
+    report.print()
+    report.save(args.output)
+    if not args.baseline:
+        return 0
+    print(f"\nComparison with {args.baseline} (threshold {args.threshold:.0%}):")
+    regressions = compare(report, args.baseline, args.threshold)
+    if regressions:
+        print("\nRegressions:\n" + "\n".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
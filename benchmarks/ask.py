@@ -0,0 +1,52 @@
+import asyncio
+from time import perf_counter
+
+import httpx
+
+from .report import Report, percentile
+from app.__main__ import app
+from app.utils import Perplexity
+
+
+async def _worker(
+    client: httpx.AsyncClient, concurrency: int, requests: int, counter: list[int], latencies: list[float]
+) -> int:
+    errors = 0
+    while counter[0] < requests:
+        counter[0] += 1
+        # unique questions and no cache, so every request goes upstream
+        body = {"message": f"benchmark {concurrency} {counter[0]}", "mode": "concise", "cache": "bypass"}
+        started = perf_counter()
+        response = await client.post("/api/perplexity/ask", json=body)
+        if response.status_code == 200:
+            latencies.append(perf_counter() - started)
+        else:
+            errors += 1
+    return errors
+
+
+async def run_ask_benchmark(report: Report, concurrency_levels: list[int], requests: int) -> None:
+    perplexity = Perplexity()
+    perplexity.start()
+    transport = httpx.ASGITransport(app=app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=60) as client:
+            # warm up: first request waits for the pool to authenticate
+            await client.post("/api/perplexity/ask", json={"message": "warm up", "mode": "concise", "cache": "bypass"})
+            for concurrency in concurrency_levels:
+                latencies: list[float] = []
+                # shared between workers: number of requests already sent
+                counter = [0]
+                started = perf_counter()
+                errors = await asyncio.gather(
+                    *(_worker(client, concurrency, requests, counter, latencies) for _ in range(concurrency))
+                )
+                elapsed = perf_counter() - started
+                prefix = f"ask.c{concurrency}"
+                report.add(f"{prefix}.throughput", len(latencies) / elapsed, "req/s", higher_is_better=True)
+                latencies_ms = [latency * 1000 for latency in latencies]
+                for percent in (50, 95, 99):
+                    report.add(f"{prefix}.p{percent}", percentile(latencies_ms, percent), "ms", higher_is_better=False)
+                report.add(f"{prefix}.errors", sum(errors), "count", higher_is_better=False)
+    finally:
+        await perplexity.stop()
@@ -0,0 +1,113 @@
+import json
+from time import perf_counter
+from typing import Callable
+from uuid import uuid4
+
+from .report import Report
+from app.schemas import PerplexityAnswer, PerplexityResponse
+from app.utils import Answer
+from app.utils.perplexity_client import Client
+
+
+def _final_frame(ack_id: int) -> str:
+    backend_uuid = str(uuid4())
+    web_results = [
+        {"name": f"Result {i}", "url": f"https://example.com/{i}", "snippet": "Lorem ipsum dolor sit amet. " * 8}
+        for i in range(10)
+    ]
+    text = {
+        "answer": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40,
+        "web_results": web_results,
+        "chunks": ["Lorem ipsum dolor sit amet. "] * 60,
+        "extra_web_results": [],
+    }
+    frame = {
+        "status": "completed",
+        "uuid": backend_uuid,
+        "backend_uuid": backend_uuid,
+        "mode": "concise",
+        "step_type": "FINAL",
+        "query_str": "What is the meaning of life?",
+        "text": json.dumps(text),
+        "related_queries": ["meaning of life philosophy", "meaning of life religion"],
+    }
+    return f"43{ack_id}" + json.dumps([frame])
+
+
+def _measure(function: Callable[[], object], iterations: int) -> float:
+    """
+    Returns mean duration of one call in microseconds.
+    """
+    function()
+    started = perf_counter()
+    for _ in range(iterations):
+        function()
+    return (perf_counter() - started) / iterations * 1e6
+
+
+class _LastReply:
+    """
+    Stands in for the reply queue of a pending request, keeps only the last reply.
+    """
+
+    def __init__(self):
+        self.reply = None
+
+    def put_nowait(self, reply: dict) -> None:
+        self.reply = reply
+
+
+def run_micro_benchmarks(report: Report, iterations: int) -> None:
+    # hot paths of the client are measured directly, without a websocket behind them
+    # pylint: disable=protected-access
+    # constructor of AsyncMixin doesn't connect anywhere until awaited
+    client = Client({}, {})
+    client._pending = {}
+    frame = _final_frame(ack_id=2)
+    # registered once, so that only frame handling is measured
+    client._pending[2] = _LastReply()
+    report.add(
+        "on_message.final_frame", _measure(lambda: client.on_message(frame), iterations), "us", higher_is_better=False
+    )
+    report.add(
+        "on_message.ignored_frame", _measure(lambda: client.on_message("3"), iterations), "us", higher_is_better=False
+    )
+
+    client.frontend_uuid = str(uuid4())
+    client.frontend_session_id = str(uuid4())
+    client._build_templates()
+    report.add(
+        "serialize.ask_frame",
+        _measure(
+            lambda: "422"
+            + client._ask_template.render(
+                query="What is the meaning of life?",
+                attachments=None,
+                mode="concise",
+                last_backend_uuid=None,
+                search_focus="internet",
+            ),
+            iterations,
+        ),
+        "us",
+        higher_is_better=False,
+    )
+
+    answer = client._pending[2].reply
+    report.add(
+        "serialize.answer_response",
+        _measure(lambda: PerplexityResponse(message=answer).model_dump_json(), iterations),
+        "us",
+        higher_is_better=False,
+    )
+    report.add(
+        "serialize.answer_projection",
+        _measure(
+            lambda: PerplexityResponse(
+                answer=PerplexityAnswer(**Answer(answer).project(["answer", "citations"]))
+            ).model_dump_json(exclude_unset=True),
+            iterations,
+        ),
+        "us",
+        higher_is_better=False,
+    )
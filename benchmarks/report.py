@@ -0,0 +1,82 @@
+import json
+import platform
+from datetime import datetime
+from math import ceil
+from pathlib import Path
+
+
+class Report:
+    """
+    Benchmark results: metric name -> value, unit and whether higher values are better.
+    """
+
+    def __init__(self):
+        self.results: dict[str, dict] = {}
+
+    def add(self, name: str, value: float | None, unit: str, higher_is_better: bool) -> None:
+        """
+        `value` is None when there is nothing to measure, e.g. latency when every request failed.
+        """
+        if value is not None:
+            value = round(value, 6)
+        self.results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+
+    def save(self, path: str) -> None:
+        data = {
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+            },
+            "results": self.results,
+        }
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(data, indent=2) + "\n", encoding="utf-8")
+
+    def print(self) -> None:
+        for name, result in self.results.items():
+            print(f"{name:<40} {_format(result['value'])} {result['unit']}")
+
+
+def _format(value: float | None) -> str:
+    return f"{value:>14.4f}" if value is not None else f"{'n/a':>14}"
+
+
+def percentile(values: list[float], percent: float) -> float | None:
+    """
+    Nearest-rank percentile, None for no values.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(ceil(percent / 100 * len(ordered)), 1) - 1]
+
+
+def compare(report: Report, baseline_path: str, threshold: float) -> list[str]:
+    """
+    Returns descriptions of metrics which got worse than baseline by more than `threshold` (share of baseline value).
+    Metrics missing from either side or without a value are skipped, metrics with zero baseline (e.g. errors)
+    must stay zero.
+    """
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for name, result in report.results.items():
+        if name not in baseline:
+            continue
+        expected = baseline[name]["value"]
+        if expected is None or result["value"] is None:
+            print(f"{name:<40} {_format(expected)} -> {_format(result['value'])} {result['unit']:<8} skipped")
+            continue
+        if expected:
+            change = (result["value"] - expected) / expected
+        else:
+            change = float(result["value"] > 0)
+        if not result["higher_is_better"]:
+            change = -change
+        status = "REGRESSION" if change < -threshold else "ok"
+        print(
+            f"{name:<40} {_format(expected)} -> {_format(result['value'])} {result['unit']:<8} {change:+8.1%} {status}"
+        )
+        if status == "REGRESSION":
+            regressions.append(f"{name}: {expected} -> {result['value']} {result['unit']}")
+    return regressions
@@ -0,0 +1,18 @@
+import pytest
+
+
+class Clock:
+    """
+    Fake `time` or `monotonic`, moved forward by tests.
+    """
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(name="clock")
+def fixture_clock() -> Clock:
+    return Clock()
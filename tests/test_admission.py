@@ -0,0 +1,40 @@
+import asyncio
+
+import pytest
+
+from app.utils.admission import AdmissionController, AdmissionRejected
+
+
+async def test_requests_over_limit_wait_for_a_slot():
+    admission = AdmissionController(max_in_flight=1, max_queue=1)
+    started = await admission.acquire()
+    waiting = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    assert (admission.in_flight, admission.queued) == (1, 1)
+    assert not waiting.done()
+    admission.release(started)
+    admission.release(await waiting)
+    assert (admission.in_flight, admission.queued) == (0, 0)
+
+
+async def test_requests_over_queue_are_rejected():
+    admission = AdmissionController(max_in_flight=1, max_queue=1, initial_service_time=4)
+    started = await admission.acquire()
+    waiting = asyncio.create_task(admission.acquire())
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected) as exc_info:
+        await admission.acquire()
+    # one request ahead in the queue and one being processed
+    assert exc_info.value.retry_after == 8
+    admission.release(started)
+    admission.release(await waiting)
+
+
+async def test_slot_is_released_on_error():
+    admission = AdmissionController(max_in_flight=1, max_queue=0)
+    with pytest.raises(RuntimeError):
+        async with admission.slot():
+            assert admission.saturated
+            raise RuntimeError
+    assert not admission.saturated
+    assert admission.estimated_wait == 0
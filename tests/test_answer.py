@@ -0,0 +1,54 @@
+import json
+
+from app.utils import Answer
+
+
+WEB_RESULTS = [
+    {"name": "First", "url": "https://example.com/1", "snippet": "one"},
+    {"name": "Second", "url": "https://example.com/2", "snippet": "two"},
+    {"name": "Third", "url": "https://example.com/3"},
+]
+
+
+def test_citations_follow_order_of_first_reference():
+    answer = Answer({"text": {"answer": "B[2] A[1] B again[2][2] C[3]", "web_results": WEB_RESULTS}})
+    assert answer.citations == ["https://example.com/2", "https://example.com/1", "https://example.com/3"]
+
+
+def test_citations_skip_references_out_of_range():
+    answer = Answer({"text": {"answer": "zero[0] too far[4] ok[1]", "web_results": WEB_RESULTS}})
+    assert answer.citations == ["https://example.com/1"]
+
+
+def test_concise_frame_with_encoded_text():
+    frame = {
+        "backend_uuid": "uuid",
+        "related_queries": ["more"],
+        "text": json.dumps({"answer": "Answer[1]", "web_results": WEB_RESULTS}),
+    }
+    assert Answer(frame).project(Answer.FIELDS) == {
+        "answer": "Answer[1]",
+        "citations": ["https://example.com/1"],
+        "web_results": [
+            {"name": "First", "url": "https://example.com/1", "snippet": "one"},
+            {"name": "Second", "url": "https://example.com/2", "snippet": "two"},
+            {"name": "Third", "url": "https://example.com/3", "snippet": ""},
+        ],
+        "related_queries": ["more"],
+        "backend_uuid": "uuid",
+    }
+
+
+def test_copilot_frame_answer_is_taken_from_final_step():
+    steps = [
+        {"step_type": "SEARCH_WEB", "content": {"queries": ["q"]}},
+        {"step_type": "FINAL", "content": {"answer": json.dumps({"answer": "Copilot[2]", "web_results": WEB_RESULTS})}},
+    ]
+    answer = Answer({"text": json.dumps(steps)})
+    assert answer.answer == "Copilot[2]"
+    assert answer.citations == ["https://example.com/2"]
+
+
+def test_text_is_not_parsed_for_frame_level_fields():
+    answer = Answer({"backend_uuid": "uuid", "text": "not json"})
+    assert answer.project(["backend_uuid", "related_queries"]) == {"backend_uuid": "uuid", "related_queries": []}
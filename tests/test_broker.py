@@ -0,0 +1,65 @@
+from datetime import datetime
+
+import pytest
+
+from app.utils.broker import Broker
+from app.utils.credentials import AuthData, Credentials
+
+
+@pytest.fixture(autouse=True)
+def fixture_frozen_time(monkeypatch, clock) -> None:
+    monkeypatch.setattr("app.utils.broker.time", clock)
+
+
+@pytest.fixture(name="broker")
+def fixture_broker(tmp_path) -> Broker:
+    broker = Broker(str(tmp_path / "broker.sqlite"))
+    yield broker
+    broker.close()
+
+
+def test_lease_is_exclusive_until_it_expires(broker, clock):
+    assert broker.acquire_lease("renewal", "worker-1", ttl=10)
+    assert not broker.acquire_lease("renewal", "worker-2", ttl=10)
+    # owner prolongs its own lease
+    clock.now += 5
+    assert broker.acquire_lease("renewal", "worker-1", ttl=10)
+    clock.now += 9
+    assert not broker.acquire_lease("renewal", "worker-2", ttl=10)
+    clock.now += 2
+    assert broker.acquire_lease("renewal", "worker-2", ttl=10)
+    assert not broker.acquire_lease("renewal", "worker-1", ttl=10)
+
+
+def test_released_lease_is_reclaimed(broker):
+    assert broker.acquire_lease("renewal", "worker-1", ttl=10)
+    # only the owner can release it
+    broker.release_lease("renewal", "worker-2")
+    assert not broker.acquire_lease("renewal", "worker-2", ttl=10)
+    broker.release_lease("renewal", "worker-1")
+    assert broker.acquire_lease("renewal", "worker-2", ttl=10)
+
+
+def test_copilot_quota_is_shared(tmp_path, broker):
+    credentials = Credentials(
+        perplexity=AuthData(headers={"a": "b"}, cookies={"c": "d"}),
+        emailnator=AuthData(headers={}, cookies={}),
+        acquired_at=datetime(2024, 1, 1),
+        copilots_left=2,
+    )
+    broker.save_credentials(credentials)
+    other_worker = Broker(str(tmp_path / "broker.sqlite"))
+    assert other_worker.use_copilot() == 1
+    assert broker.use_copilot() == 0
+    assert other_worker.load_credentials().perplexity.cookies == {"c": "d"}
+    other_worker.close()
+
+
+def test_stale_accounts_are_dropped(broker, clock):
+    broker.push_account({"h": "1"}, {"c": "1"}, 5, 3)
+    clock.now += 100
+    broker.push_account({"h": "2"}, {"c": "2"}, 5, 3)
+    assert broker.accounts_ready() == 2
+    assert broker.pop_account(max_age=50) == ({"h": "2"}, {"c": "2"}, 5, 3)
+    assert broker.pop_account(max_age=50) is None
+    assert broker.accounts_ready() == 0
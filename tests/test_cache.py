@@ -0,0 +1,62 @@
+import pytest
+
+from app.utils.cache import AnswerCache
+
+
+@pytest.fixture(autouse=True)
+def fixture_frozen_time(monkeypatch, clock) -> None:
+    monkeypatch.setattr("app.utils.cache.time", clock)
+
+
+def make_cache(max_size: int = 2, path: str = "") -> AnswerCache:
+    return AnswerCache(max_size=max_size, ttl={"concise": 60, "copilot": 0}, path=path)
+
+
+async def test_hit_before_ttl_expires(clock):
+    cache = make_cache()
+    await cache.set(("q", "concise", "internet"), {"answer": 1}, mode="concise")
+    clock.now += 59
+    assert await cache.get(("q", "concise", "internet")) == {"answer": 1}
+    assert cache.hits == 1
+
+
+async def test_miss_after_ttl_expires(clock):
+    cache = make_cache()
+    await cache.set(("q", "concise", "internet"), {"answer": 1}, mode="concise")
+    clock.now += 60
+    assert await cache.get(("q", "concise", "internet")) is None
+    assert cache.size == 0
+    assert cache.misses == 1
+
+
+async def test_zero_ttl_disables_caching():
+    cache = make_cache()
+    await cache.set(("q", "copilot", "internet"), {"answer": 1}, mode="copilot")
+    assert await cache.get(("q", "copilot", "internet")) is None
+
+
+async def test_least_recently_used_is_evicted():
+    cache = make_cache(max_size=2)
+    await cache.set(("a", "concise", "internet"), {"answer": "a"}, mode="concise")
+    await cache.set(("b", "concise", "internet"), {"answer": "b"}, mode="concise")
+    # "a" becomes the most recently used one
+    await cache.get(("a", "concise", "internet"))
+    await cache.set(("c", "concise", "internet"), {"answer": "c"}, mode="concise")
+    assert cache.size == 2
+    assert await cache.get(("b", "concise", "internet")) is None
+    assert await cache.get(("a", "concise", "internet")) == {"answer": "a"}
+    assert await cache.get(("c", "concise", "internet")) == {"answer": "c"}
+
+
+async def test_file_tier_survives_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.sqlite")
+    cache = make_cache(path=path)
+    await cache.set(("q", "concise", "internet"), {"answer": "кеш"}, mode="concise")
+    cache.close()
+    restarted = make_cache(path=path)
+    assert await restarted.get(("q", "concise", "internet")) == {"answer": "кеш"}
+    restarted.close()
+    expired = make_cache(path=path)
+    clock.now += 60
+    assert await expired.get(("q", "concise", "internet")) is None
+    expired.close()
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from app.utils.coalescer import Coalescer
+
+
+async def test_concurrent_calls_share_one_result():
+    coalescer = Coalescer()
+    calls = 0
+    release = asyncio.Event()
+
+    async def factory() -> int:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return 42
+
+    callers = [asyncio.create_task(coalescer.run("key", factory)) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert coalescer.in_flight == 1
+    release.set()
+    assert await asyncio.gather(*callers) == [42, 42, 42]
+    assert calls == 1
+    assert (coalescer.misses, coalescer.hits) == (1, 2)
+    assert coalescer.in_flight == 0
+
+
+async def test_different_keys_run_separately():
+    coalescer = Coalescer()
+
+    async def factory(value: str) -> str:
+        await asyncio.sleep(0)
+        return value
+
+    results = await asyncio.gather(coalescer.run("a", lambda: factory("a")), coalescer.run("b", lambda: factory("b")))
+    assert results == ["a", "b"]
+    assert coalescer.misses == 2
+
+
+async def test_error_is_propagated_to_every_caller():
+    coalescer = Coalescer()
+    release = asyncio.Event()
+
+    async def factory() -> None:
+        await release.wait()
+        raise ValueError("upstream failed")
+
+    callers = [asyncio.create_task(coalescer.run("key", factory)) for _ in range(2)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+    assert coalescer.in_flight == 0
+
+
+async def test_cancelled_caller_does_not_cancel_others():
+    coalescer = Coalescer()
+    release = asyncio.Event()
+
+    async def factory() -> str:
+        await release.wait()
+        return "done"
+
+    first = asyncio.create_task(coalescer.run("key", factory))
+    second = asyncio.create_task(coalescer.run("key", factory))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+    assert await second == "done"
+    with pytest.raises(asyncio.CancelledError):
+        await first
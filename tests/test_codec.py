@@ -0,0 +1,34 @@
+import json
+
+from app.utils.codec import FrameTemplate, Slot, dumps, loads
+
+
+def test_dumps_is_compact_and_keeps_unicode():
+    assert dumps({"query": "что такое жизнь?", "n": [1, None]}) == '{"query":"что такое жизнь?","n":[1,null]}'
+    assert loads('{"a": [1, "б"]}') == {"a": [1, "б"]}
+
+
+def test_template_renders_same_json_as_full_serialization():
+    template = FrameTemplate(
+        [
+            "perplexity_ask",
+            Slot("query"),
+            {"attachments": Slot("attachments"), "version": "2.1", "mode": Slot("mode"), "gpt4": False},
+        ]
+    )
+    frame = template.render(query='say "hi"\n', attachments=["https://x/1"], mode="concise")
+    assert json.loads(frame) == [
+        "perplexity_ask",
+        'say "hi"\n',
+        {"attachments": ["https://x/1"], "version": "2.1", "mode": "concise", "gpt4": False},
+    ]
+
+
+def test_template_fills_repeated_slot_everywhere():
+    template = FrameTemplate({"last_backend_uuid": Slot("uuid"), "existing_entry_uuid": Slot("uuid")})
+    assert json.loads(template.render(uuid="abc")) == {"last_backend_uuid": "abc", "existing_entry_uuid": "abc"}
+
+
+def test_template_without_slots_is_constant():
+    template = FrameTemplate(["get_upload_url", {"version": "2.1"}])
+    assert template.render() == '["get_upload_url",{"version":"2.1"}]'
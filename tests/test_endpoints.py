@@ -0,0 +1,61 @@
+# pylint: disable=protected-access
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.endpoints import health_check
+from app.endpoints import perplexity as endpoints
+from app.schemas import PerplexityBatchRequest, PerplexityRequest, TraceKind
+from app.utils.tracing import TRACER
+
+
+async def test_stream_reports_failure_as_error_event(monkeypatch):
+    async def ask_stream(**kwargs):  # pylint: disable=unused-argument
+        yield {"step_type": "SEARCH_WEB"}
+        raise ConnectionError("Websocket connection closed")
+
+    released = []
+    monkeypatch.setattr(endpoints.perplexity_client, "ask_stream", ask_stream)
+    stream = endpoints._stream_events(PerplexityRequest(message="q"), lambda: released.append(True))
+    events = [event async for event in stream]
+    assert events[0].startswith("event: step\n")
+    assert events[-1] == 'event: error\ndata: {"detail":"Websocket connection closed"}\n\n'
+    assert released == [True]
+
+
+async def test_batch_over_limit_is_rejected(monkeypatch):
+    monkeypatch.setenv("PERPLEXITY_BATCH_MAX_SIZE", "2")
+    with pytest.raises(HTTPException) as exc_info:
+        await endpoints.ask_perplexity_batch(PerplexityBatchRequest(requests=[PerplexityRequest()] * 3))
+    assert exc_info.value.status_code == 422
+
+
+async def test_batch_questions_are_finished_when_client_goes_away(monkeypatch):
+    finished = []
+
+    async def ask(query: str, **kwargs) -> dict:  # pylint: disable=unused-argument
+        try:
+            if query != "fast":
+                await asyncio.sleep(10)
+            return {"query": query}
+        finally:
+            finished.append(query)
+
+    monkeypatch.setattr(endpoints.perplexity_client, "ask", ask)
+    requests = [PerplexityRequest(message=message) for message in ("slow", "fast", "slower")]
+    answers = endpoints._answer_batch(requests)
+    assert '"index":1' in await anext(answers)
+    await answers.aclose()
+    assert sorted(finished) == ["fast", "slow", "slower"]
+
+
+async def test_traces_are_filtered_by_kind():
+    with TRACER.span("perplexity.ask_later", kind=TraceKind.REQUEST.value):
+        pass
+    with TRACER.span("perplexity.ask_pool_refill"):
+        pass
+    requests = {span["name"] for span in await health_check.slowest_traces(limit=100, kind=TraceKind.REQUEST)}
+    background = {span["name"] for span in await health_check.slowest_traces(limit=100, kind=TraceKind.BACKGROUND)}
+    assert "perplexity.ask_later" in requests - background
+    assert "perplexity.ask_pool_refill" in background - requests
@@ -0,0 +1,47 @@
+# pylint: disable=protected-access
+import pytest
+
+from app.schemas import PerplexityMode
+from app.utils import Perplexity
+
+
+class FakeClient:
+    async def search_stream(self, **kwargs):  # pylint: disable=unused-argument
+        yield {"step_type": "SEARCH_WEB"}
+        yield {"step_type": "FINAL"}
+
+
+@pytest.fixture(name="perplexity")
+def fixture_perplexity(monkeypatch) -> tuple[Perplexity, list[FakeClient]]:
+    perplexity = Perplexity()
+    client = FakeClient()
+    released = []
+
+    async def get() -> FakeClient:
+        return client
+
+    async def release(client: FakeClient) -> None:
+        released.append(client)
+
+    monkeypatch.setattr(perplexity._pool, "get", get)
+    monkeypatch.setattr(perplexity, "_release_client", release)
+    monkeypatch.setattr(perplexity, "_broker", None)
+    monkeypatch.setattr(perplexity, "copilots_left", 5)
+    return perplexity, released
+
+
+async def test_copilot_is_spent_when_answer_is_read(perplexity):
+    perplexity, released = perplexity
+    steps = [step async for step in perplexity.ask_stream("q", PerplexityMode.COPILOT)]
+    assert steps[-1] == {"step_type": "FINAL"}
+    assert perplexity.copilots_left == 4
+    assert len(released) == 1
+
+
+async def test_copilot_is_spent_when_consumer_stops_early(perplexity):
+    perplexity, released = perplexity
+    stream = perplexity.ask_stream("q", PerplexityMode.COPILOT)
+    assert await anext(stream) == {"step_type": "SEARCH_WEB"}
+    await stream.aclose()
+    assert perplexity.copilots_left == 4
+    assert len(released) == 1
@@ -0,0 +1,35 @@
+# pylint: disable=protected-access
+import pytest
+
+from app.utils.perplexity_client import Client
+
+
+@pytest.fixture(name="client")
+def fixture_client() -> Client:
+    # constructor of AsyncMixin doesn't connect anywhere until awaited
+    client = Client({}, {})
+    client._pending = {}
+    client._ws_closed = False
+    return client
+
+
+async def test_pending_requests_fail_once_websocket_is_closed(client):
+    client._expect(2)
+    client.on_close()
+    with pytest.raises(ConnectionError):
+        await client._receive(2, timeout=1)
+
+
+async def test_requests_after_close_fail_without_waiting(client):
+    client.on_close()
+    client._expect(3)
+    with pytest.raises(ConnectionError):
+        await client._receive(3, timeout=0.01)
+
+
+async def test_replies_are_routed_by_ack_id(client):
+    client._expect(2)
+    client._expect(3)
+    client.on_message('433[{"status": "completed"}]')
+    assert await client._receive(3, timeout=1) == {"status": "completed"}
+    assert client._pending[2].empty()
@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+
+from app.utils.pool import ClientPool
+
+
+class FakeClient:
+    def __init__(self, created_at: float):
+        self.created_at = created_at
+        self.closed = False
+
+    async def close(self) -> None:
+        # gives requests a chance to take clients out of the pool meanwhile
+        await asyncio.sleep(0.01)
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fixture_frozen_time(monkeypatch, clock) -> None:
+    monkeypatch.setattr("app.utils.pool.monotonic", clock)
+
+
+def make_factory(clock, created: list[FakeClient]):
+    async def factory() -> FakeClient:
+        client = FakeClient(clock.now)
+        created.append(client)
+        return client
+
+    return factory
+
+
+async def wait_ready(pool: ClientPool, ready: int) -> None:
+    while pool.ready < ready:
+        await asyncio.sleep(0)
+
+
+async def test_pool_is_warmed_up_and_refilled(clock):
+    created = []
+    pool = ClientPool(make_factory(clock, created), size=2, max_age=60)
+    pool.start()
+    await wait_ready(pool, 2)
+    client = await pool.get()
+    assert client in created[:2]
+    await wait_ready(pool, 2)
+    assert len(created) == 3
+    await pool.stop()
+    assert all(client.closed for client in created if client is not created[0])
+
+
+async def test_stale_clients_are_swept_while_requests_take_clients(clock):
+    created = []
+    pool = ClientPool(make_factory(clock, created), size=3, max_age=0.05)
+    pool.start()
+    await wait_ready(pool, 3)
+    first_generation = list(created)
+    clock.now += 1
+    # sweep runs every max_age seconds, requests drain the pool while stale clients are being closed
+    await asyncio.sleep(0.06)
+    taken = [await pool.get() for _ in range(3)]
+    await asyncio.sleep(0.1)
+    assert all(client.closed for client in first_generation)
+    assert not any(client in first_generation for client in taken)
+    assert not any(task.done() for task in pool._producers)  # pylint: disable=protected-access
+    await pool.stop()
+
+
+async def test_waiters_get_factory_error_after_timeout():
+    async def factory() -> FakeClient:
+        raise ConnectionError("Emailnator is down")
+
+    pool = ClientPool(factory, size=1, max_age=60, retry_timeout=0, wait_timeout=0.05)
+    with pytest.raises(RuntimeError, match="No client became ready") as exc_info:
+        await pool.get()
+    assert isinstance(exc_info.value.__cause__, ConnectionError)
+    await pool.stop()
+
+
+def test_negative_size_is_rejected():
+    with pytest.raises(ValueError):
+        ClientPool(lambda: None, size=-1, max_age=60)